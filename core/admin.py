@@ -5,7 +5,8 @@ and filtering options for better management of treasure hunts, clues, and user p
 """
 
 from django.contrib import admin
-from .models import TreasureHunt, Clue, UserProgress
+from django.utils import timezone
+from .models import TreasureHunt, Clue, UserProgress, Job, ImageBlob
 
 
 @admin.register(TreasureHunt)
@@ -26,6 +27,8 @@ class TreasureHuntAdmin(admin.ModelAdmin):
     ]
     list_filter = ["is_active", "is_public", "created_at", "end_date"]
     search_fields = ["title", "description", "creator__username"]
+    # Images are stored and reference counted by the image jobs
+    readonly_fields = ["image"]
 
 
 @admin.register(Clue)
@@ -37,6 +40,8 @@ class ClueAdmin(admin.ModelAdmin):
     list_display = ["treasure_hunt", "order", "created_at"]
     list_filter = ["treasure_hunt", "created_at"]
     ordering = ["treasure_hunt", "order"]
+    # Images are stored and reference counted by the image jobs
+    readonly_fields = ["reference_image"]
 
 
 @admin.register(UserProgress)
@@ -55,3 +60,39 @@ class UserProgressAdmin(admin.ModelAdmin):
     ]
     list_filter = ["is_completed", "started_at"]
     search_fields = ["user__username", "treasure_hunt__title"]
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the Job model.
+    """
+
+    list_display = [
+        "kind",
+        "treasure_hunt",
+        "status",
+        "attempts",
+        "created_at",
+        "finished_at",
+    ]
+    list_filter = ["kind", "status", "created_at"]
+    search_fields = ["treasure_hunt__title", "error"]
+    actions = ["retry_jobs"]
+
+    @admin.action(description="Retry the selected failed jobs")
+    def retry_jobs(self, request, queryset):
+        queryset.filter(status=Job.FAILED).update(
+            status=Job.PENDING, attempts=0, run_after=timezone.now()
+        )
+
+
+@admin.register(ImageBlob)
+class ImageBlobAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the ImageBlob model.
+    """
+
+    list_display = ["image", "references", "created_at"]
+    search_fields = ["image", "digest", "source_digest"]
+    readonly_fields = ["digest", "source_digest", "image", "variants", "references"]
@@ -0,0 +1,669 @@
+"""
+Benchmarks for the core app.
+
+Each benchmark is a function registered with the @benchmark decorator that
+receives the requested problem size and yields (label, value) rows. They are
+run with the benchmark management command:
+
+    python manage.py benchmark geofence --size 100000
+
+The modules using models are imported by the benchmarks needing them, since
+this module is also imported by the processes that optimize_image spawns,
+where the app registry is not set up.
+"""
+
+import io
+import json
+import multiprocessing
+import random
+import time
+import uuid
+
+import numpy as np
+
+from PIL import Image
+from django.db import connection, transaction
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .geo import geohash_encode, haversine_m, haversine_many_m
+from .storage import URLCachingS3Storage
+from .utils import (
+    IMAGE_VARIANTS,
+    generate_image_embedding,
+    generate_image_embeddings,
+    image_variants,
+    load_clip,
+    load_embedding_image,
+    optimize_image,
+)
+
+BENCHMARKS = {}
+
+
+def benchmark(name, default_size):
+    """
+    Register a benchmark function under the given name.
+    """
+
+    def decorator(func):
+        func.default_size = default_size
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def best_of(func, repeat=5):
+    """
+    Run a function several times and return the fastest duration in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def random_points(size, center=(-0.1807, -78.4678), spread=0.01, seed=0):
+    """
+    Return two lists with the coordinates of random points around a center.
+    """
+    rng = random.Random(seed)
+    lats = [center[0] + rng.uniform(-spread, spread) for _ in range(size)]
+    lngs = [center[1] + rng.uniform(-spread, spread) for _ in range(size)]
+    return lats, lngs
+
+
+@benchmark("geofence", default_size=100_000)
+def geofence_benchmark(size):
+    """
+    Compare the evaluation of GPS fixes against one clue location.
+
+    - degree box: the former check with a fixed margin of 0.0001 degrees
+    - scalar haversine: haversine_m called once per fix
+    - vectorized haversine: haversine_many_m called once for all the fixes
+    """
+    clue_lat, clue_lng, radius = -0.1807, -78.4678, 15
+    lats, lngs = random_points(size)
+
+    def degree_box():
+        margin = 0.0001
+        return [
+            abs(clue_lat - lat) <= margin and abs(clue_lng - lng) <= margin
+            for lat, lng in zip(lats, lngs)
+        ]
+
+    def scalar_haversine():
+        return [
+            haversine_m(clue_lat, clue_lng, lat, lng) <= radius
+            for lat, lng in zip(lats, lngs)
+        ]
+
+    def vectorized_haversine():
+        return haversine_many_m(clue_lat, clue_lng, lats, lngs) <= radius
+
+    for label, func in [
+        ("degree box", degree_box),
+        ("scalar haversine", scalar_haversine),
+        ("vectorized haversine", vectorized_haversine),
+    ]:
+        seconds = best_of(func)
+        yield label, f"{seconds * 1000:.2f} ms ({size / seconds:,.0f} fixes/s)"
+
+
+@benchmark("nearby", default_size=100_000)
+def nearby_benchmark(size):
+    """
+    Measure the search of the hunts starting within 2 km of a location, as done
+    by the nearby_hunts endpoint, with the given number of hunts spread over a
+    400 km wide region (requires PostgreSQL).
+
+    The hunts are created with only their start locations and then removed by
+    rolling back the transaction they were created in.
+
+    - linear scan: the start locations of every hunt, filtered with haversine
+    - geohash index: TreasureHunt.objects.near, prefix lookups on the index on
+      start_geohash, then haversine over the candidates
+
+    The plan of the geohash query shows whether the index is used.
+    """
+    from django.contrib.auth.models import User
+
+    from .models import TreasureHunt
+
+    radius = 2000
+    queries = list(zip(*random_points(20, spread=2.0, seed=1)))
+
+    with transaction.atomic():
+        creator = User.objects.create(username=f"benchmark-{uuid.uuid4()}")
+        lats, lngs = random_points(size, spread=2.0)
+        start = time.perf_counter()
+        TreasureHunt.objects.bulk_create(
+            (
+                TreasureHunt(
+                    title=f"Hunt {i}",
+                    description="Benchmark",
+                    creator=creator,
+                    start_latitude=lat,
+                    start_longitude=lng,
+                    start_geohash=geohash_encode(lat, lng),
+                )
+                for i, (lat, lng) in enumerate(zip(lats, lngs))
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {TreasureHunt._meta.db_table}")
+        yield "hunts creation", f"{time.perf_counter() - start:.1f} s"
+
+        def within(lat, lng, hunts):
+            rows = list(hunts.values_list("id", "start_latitude", "start_longitude"))
+            if not rows:
+                return []
+            distances = haversine_many_m(
+                lat, lng, [row[1] for row in rows], [row[2] for row in rows]
+            )
+            return [
+                row[0] for row, distance in zip(rows, distances) if distance <= radius
+            ]
+
+        def linear_scan():
+            hunts = TreasureHunt.objects.exclude(start_geohash="")
+            return [within(lat, lng, hunts) for lat, lng in queries]
+
+        def geohash_lookup():
+            return [
+                within(lat, lng, TreasureHunt.objects.near(lat, lng, radius))
+                for lat, lng in queries
+            ]
+
+        found = sum(len(result) for result in geohash_lookup())
+        assert found == sum(len(result) for result in linear_scan())
+        lat, lng = queries[0]
+        plan = TreasureHunt.objects.near(lat, lng, radius).values("id").explain()
+        yield "geohash plan", plan.splitlines()[0].strip()
+        for label, func in [
+            ("linear scan", linear_scan),
+            ("geohash index", geohash_lookup),
+        ]:
+            seconds = best_of(func, repeat=3) / len(queries)
+            yield (
+                label,
+                f"{seconds * 1000:.3f} ms per query "
+                f"({found / len(queries):.1f} hits)",
+            )
+
+        transaction.set_rollback(True)
+
+
+def synthetic_photo(megapixels, seed=0):
+    """
+    Return the bytes of a noisy JPEG photo of about the given number of megapixels.
+    """
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+    pixels += np.linspace(0, 190, width, dtype=np.uint8)[None, :, None]
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, format="JPEG", quality=95)
+    return output.getvalue()
+
+
+def textured_photo(megapixels, seed=0):
+    """
+    Return the bytes of a JPEG photo of about the given number of megapixels
+    with details at every scale, which unlike plain noise survive downscaling.
+    """
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    rng = np.random.default_rng(seed)
+    pixels = np.zeros((height, width, 3), dtype=np.float32)
+    # Like in photos, the finer the details, the lower their contrast
+    for cells, contrast in [(4, 96), (16, 64), (64, 48), (256, 24), (1024, 12)]:
+        octave = rng.integers(0, 256, (cells * 3 // 4, cells, 3), dtype=np.uint8)
+        octave = Image.fromarray(octave).resize((width, height), Image.BICUBIC)
+        pixels += np.asarray(octave, dtype=np.float32) * contrast / 255
+    output = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(output, format="JPEG", quality=95)
+    return output.getvalue()
+
+
+def _memory_status_kb(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets the peak RSS (VmHWM) of the process
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+
+def _previous_optimize_image(image_file):
+    # optimize_image as it was before the size budget was enforced
+    img = Image.open(image_file)
+    if img.mode == "RGBA":
+        img = img.convert("RGB")
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=80, optimize=True)
+    output.seek(0)
+    return output
+
+
+def _measure_optimization(func, data, results):
+    # Runs in a fresh process so that its peak RSS only reflects this call
+    image_file = io.BytesIO(data)
+    image_file.name = "photo.jpg"
+    _reset_peak_rss()
+    baseline = _memory_status_kb("VmRSS")
+    start = time.perf_counter()
+    output = func(image_file)
+    seconds = time.perf_counter() - start
+    peak = _memory_status_kb("VmHWM")
+    output.seek(0, io.SEEK_END)
+    results.put((seconds, max(0, peak - baseline), output.tell()))
+
+
+@benchmark("optimize_image", default_size=24)
+def optimize_image_benchmark(size):
+    """
+    Measure the time and peak memory of optimizing photos of increasing size.
+
+    The size is the largest photo, in megapixels. Each measurement runs in a
+    fresh process; peak RSS is the growth of the resident memory during the
+    call, read from /proc (Linux only).
+    """
+    context = multiprocessing.get_context("spawn")
+    for megapixels in [mp for mp in (1, 4, 12, 24, 48) if mp <= size] or [size]:
+        data = synthetic_photo(megapixels)
+        for label, func in [
+            ("previous", _previous_optimize_image),
+            ("optimize_image", optimize_image),
+        ]:
+            results = context.Queue()
+            process = context.Process(
+                target=_measure_optimization, args=(func, data, results)
+            )
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise RuntimeError(
+                    f"The {label} measurement of {megapixels} MP failed "
+                    f"with exit code {process.exitcode}"
+                )
+            seconds, peak_kb, output_size = results.get()
+            yield (
+                f"{megapixels} MP {label}",
+                f"{seconds * 1000:.0f} ms, peak +{peak_kb / 1024:.0f} MB RSS, "
+                f"{len(data) // 1024} KB -> {output_size // 1024} KB",
+            )
+
+
+@benchmark("image_variants", default_size=12)
+def image_variants_benchmark(size):
+    """
+    Measure the responsive variants generated for a photo of the given size,
+    in megapixels.
+
+    Compares the weight of the optimized image, formerly served everywhere,
+    with the variants that browsers pick for the hunt cards of the list.
+    """
+    image_file = io.BytesIO(textured_photo(size))
+    image_file.name = "photo.jpg"
+    optimized = optimize_image(image_file)
+    optimized_size = optimized.seek(0, io.SEEK_END)
+    optimized.seek(0)
+    yield "optimized image", f"{optimized_size // 1024} KB"
+
+    start = time.perf_counter()
+    variants = image_variants(optimized)
+    yield "generation", f"{(time.perf_counter() - start) * 1000:.0f} ms"
+
+    for name, variant in variants.items():
+        for image_format, variant_file in variant["files"].items():
+            variant_size = variant_file.seek(0, io.SEEK_END)
+            yield (
+                f"{name} {image_format}",
+                f"{variant['width']}x{variant['height']}, {variant_size // 1024} KB "
+                f"({optimized_size / variant_size:.1f}x smaller)",
+            )
+
+
+@benchmark("media_urls", default_size=500)
+def media_urls_benchmark(size):
+    """
+    Measure the generation of the image URLs of a catalog of hunts of the given size.
+
+    Each hunt card links its fallback JPEG and its variants in both formats,
+    as rendered by the responsive_image tag. URLs are signed locally with
+    dummy credentials, so no request is sent to S3.
+
+    - uncached: S3Boto3Storage signs every URL on every render
+    - cached: URLCachingS3Storage only signs them on the first render
+    """
+    options = {
+        "bucket_name": "benchmark",
+        "access_key": "benchmark",
+        "secret_key": "benchmark",
+        "region_name": "us-east-1",
+    }
+    names = []
+    for hunt in range(size):
+        root = f"images/{hunt:02x}/{hunt:064x}"
+        names.append(f"{root}_{IMAGE_VARIANTS['card']}w.jpg")
+        for width in IMAGE_VARIANTS.values():
+            names += [f"{root}_{width}w.webp", f"{root}_{width}w.jpg"]
+    yield "URLs per render", len(names)
+
+    def render(storage):
+        for name in names:
+            storage.url(name)
+
+    storage = S3Boto3Storage(**options)
+    render(storage)
+    yield "uncached", f"{best_of(lambda: render(storage)) * 1000:.1f} ms"
+
+    storage = URLCachingS3Storage(**options)
+
+    def first_render():
+        storage.clear_url_cache()
+        render(storage)
+
+    yield "cached, first render", f"{best_of(first_render) * 1000:.1f} ms"
+    yield "cached, next renders", f"{best_of(lambda: render(storage)) * 1000:.1f} ms"
+
+
+@benchmark("embeddings", default_size=64)
+def embeddings_benchmark(size):
+    """
+    Measure the throughput and peak memory of embedding the given number of
+    clue thumbnails, one at a time and in batches (requires torch and
+    transformers).
+
+    Peak RSS is the growth of the resident memory during the run once the
+    model is loaded, read from /proc (Linux only).
+    """
+    thumbnails = []
+    for seed in range(size):
+        thumbnail = io.BytesIO(textured_photo(0.08, seed=seed))
+        thumbnail.name = f"thumbnail_{seed}.jpg"
+        thumbnails.append(thumbnail)
+
+    start = time.perf_counter()
+    load_clip()
+    yield "model loading", f"{time.perf_counter() - start:.1f} s"
+
+    def one_by_one():
+        for thumbnail in thumbnails:
+            thumbnail.seek(0)
+            generate_image_embedding(thumbnail, as_list=False)
+
+    def batched(batch_size):
+        for start in range(0, len(thumbnails), batch_size):
+            images = []
+            for thumbnail in thumbnails[start : start + batch_size]:
+                thumbnail.seek(0)
+                images.append(load_embedding_image(thumbnail))
+            generate_image_embeddings(images)
+
+    for label, func in [
+        ("one by one", one_by_one),
+        ("batches of 8", lambda: batched(8)),
+        ("batches of 16", lambda: batched(16)),
+        ("batches of 32", lambda: batched(32)),
+    ]:
+        _reset_peak_rss()
+        baseline = _memory_status_kb("VmRSS")
+        seconds = best_of(func, repeat=3)
+        peak_kb = max(0, _memory_status_kb("VmHWM") - baseline)
+        yield (
+            label,
+            f"{size / seconds:.1f} images/s, peak +{peak_kb / 1024:.0f} MB RSS",
+        )
+
+
+def synthetic_embeddings(size, dimensions=512, places=1000, seed=0):
+    """
+    Yield chunks of normalized random embeddings clustered around places, like
+    the embeddings of photos of the same places.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((places, dimensions), dtype=np.float32)
+    for start in range(0, size, 10_000):
+        count = min(10_000, size - start)
+        vectors = centers[rng.integers(0, places, count)]
+        vectors += 0.5 * rng.standard_normal((count, dimensions), dtype=np.float32)
+        yield vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _percentile_ms(durations, percentile):
+    return f"{np.percentile(durations, percentile) * 1000:.1f}"
+
+
+@benchmark("photo_match", default_size=1_000_000)
+def photo_match_benchmark(size):
+    """
+    Measure the nearest clue search of core.photo_match over the given number of
+    synthetic 512-dimension embeddings (requires PostgreSQL with pgvector).
+
+    The embeddings are copied to a temporary halfvec table indexed like
+    Clue.image_embedding. Queries are noisy copies of stored embeddings, like
+    new photos of known places, and return their 10 closest embeddings:
+
+    - exact: sequential scan computing every distance
+    - hnsw: index scan with several hnsw.ef_search values, with the recall of
+      the exact results
+
+    The target is a p95 latency below 20 ms with a recall above 0.95 at the
+    default PHOTO_MATCH_EF_SEARCH. Comparing a photo with the current clue
+    only is a single dot product, also measured.
+    """
+    from .photo_match import similarity
+
+    rng = np.random.default_rng(1)
+    queries = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE benchmark_embedding "
+            "(id integer PRIMARY KEY, embedding halfvec(512))"
+        )
+        start = time.perf_counter()
+        next_id = 0
+        for vectors in synthetic_embeddings(size):
+            rows = io.StringIO()
+            for vector in vectors:
+                rows.write(f"{next_id}\t[{','.join(f'{x:.6f}' for x in vector)}]\n")
+                next_id += 1
+            rows.seek(0)
+            cursor.copy_from(rows, "benchmark_embedding", columns=("id", "embedding"))
+            if len(queries) < 100:
+                noisy = vectors[:10] + 0.1 * rng.standard_normal(
+                    vectors[:10].shape, dtype=np.float32
+                )
+                queries += list(noisy / np.linalg.norm(noisy, axis=1, keepdims=True))
+        yield "loading", f"{time.perf_counter() - start:.0f} s"
+
+        start = time.perf_counter()
+        cursor.execute(
+            "CREATE INDEX ON benchmark_embedding USING hnsw "
+            "(embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)"
+        )
+        cursor.execute("ANALYZE benchmark_embedding")
+        yield "index build", f"{time.perf_counter() - start:.0f} s"
+
+        def search(query):
+            cursor.execute(
+                "SELECT id FROM benchmark_embedding "
+                "ORDER BY embedding <=> %s::halfvec LIMIT 10",
+                [f"[{','.join(f'{x:.6f}' for x in query)}]"],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+        def measure():
+            durations, results = [], []
+            for query in queries:
+                start = time.perf_counter()
+                results.append(search(query))
+                durations.append(time.perf_counter() - start)
+            return results, (
+                f"p50 {_percentile_ms(durations, 50)} ms, "
+                f"p95 {_percentile_ms(durations, 95)} ms"
+            )
+
+        cursor.execute("SET enable_indexscan = off")
+        exact, latency = measure()
+        yield "exact", latency
+        cursor.execute("SET enable_indexscan = on")
+        for ef_search in (40, 100, 200):
+            cursor.execute(f"SET hnsw.ef_search = {ef_search}")
+            results, latency = measure()
+            recall = np.mean(
+                [len(found & expected) / 10 for found, expected in zip(results, exact)]
+            )
+            yield f"hnsw ef_search={ef_search}", f"{latency}, recall {recall:.3f}"
+
+        cursor.execute("RESET hnsw.ef_search")
+        cursor.execute("DROP TABLE benchmark_embedding")
+
+    seconds = best_of(lambda: [similarity(queries[0], query) for query in queries])
+    yield "current clue comparison", f"{seconds / len(queries) * 1e6:.1f} us"
+
+
+def _top_k(scores, k=10):
+    # Indices of the k highest scores of each row, in no particular order
+    return np.argpartition(-scores, k, axis=1)[:, :k]
+
+
+@benchmark("embedding_precision", default_size=100_000)
+def embedding_precision_benchmark(size):
+    """
+    Compare the size and the search recall of the storage formats of the
+    512-dimension embeddings, over the given number of synthetic embeddings.
+
+    Recall is the share of the 10 nearest float32 neighbors of 100 query photos
+    found when the stored embeddings are:
+
+    - vector: float32, the former Clue.image_embedding
+    - halfvec: float16, the current Clue.image_embedding
+    - int8: one signed byte per dimension with a scale per vector
+    - bit: one bit per dimension, the sign of each value
+
+    Sizes are the bytes stored per embedding, including the pgvector header.
+    """
+    vectors = np.concatenate(list(synthetic_embeddings(size)))
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, size, 100)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape, dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    expected = _top_k(queries @ vectors.T)
+
+    scales = np.abs(vectors).max(axis=1) / 127
+    int8 = np.round(vectors / scales[:, None]).astype(np.int8)
+    bits = vectors > 0
+    dimensions = vectors.shape[1]
+    for label, bytes_per_vector, scores in [
+        ("vector", 8 + 4 * dimensions, lambda: queries @ vectors.T),
+        (
+            "halfvec",
+            8 + 2 * dimensions,
+            lambda: queries @ vectors.astype(np.float16).astype(np.float32).T,
+        ),
+        (
+            "int8",
+            8 + 4 + dimensions,
+            lambda: (queries @ int8.T.astype(np.float32)) * scales[None, :],
+        ),
+        (
+            "bit",
+            8 + dimensions // 8,
+            lambda: (queries > 0).astype(np.float32) @ bits.T.astype(np.float32)
+            + (queries <= 0).astype(np.float32) @ (~bits).T.astype(np.float32),
+        ),
+    ]:
+        found = _top_k(scores())
+        recall = np.mean(
+            [len(set(a) & set(b)) / 10 for a, b in zip(found, expected)]
+        )
+        yield (
+            label,
+            f"{bytes_per_vector} bytes, {bytes_per_vector * size / 2**20:.0f} MB, "
+            f"recall@10 {recall:.3f}",
+        )
+
+
+def _synthetic_hunt_lines(size, clues_per_hunt=10, seed=0):
+    # NDJSON lines of hunts with the given total number of clues
+    lats, lngs = random_points(size, seed=seed)
+    for first in range(0, size, clues_per_hunt):
+        clues = [
+            {
+                "order": index + 1,
+                "hint_text": f"Hint {first + index}",
+                "latitude": lats[first + index],
+                "longitude": lngs[first + index],
+                "radius": 15,
+            }
+            for index in range(min(clues_per_hunt, size - first))
+        ]
+        yield json.dumps(
+            {"title": f"Hunt {first}", "description": "Benchmark", "clues": clues}
+        )
+
+
+class _CountingSink:
+    # Text stream discarding what is written, counting its characters
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+
+@benchmark("hunt_transfer", default_size=100_000)
+def hunt_transfer_benchmark(size):
+    """
+    Measure the NDJSON import and export of core.transfer with the given number
+    of clues, in hunts of 10 clues (requires PostgreSQL).
+
+    The hunts are imported from a generated stream, exported back and then
+    removed by rolling back the transaction they were created in. The peak RSS
+    growth shows whether memory stays bounded by the batch size.
+    """
+    from django.contrib.auth.models import User
+
+    from .models import TreasureHunt
+    from .transfer import export_hunts, import_hunts
+
+    with transaction.atomic():
+        creator = User.objects.create(username=f"benchmark-{uuid.uuid4()}")
+
+        _reset_peak_rss()
+        baseline = _memory_status_kb("VmRSS")
+        start = time.perf_counter()
+        totals = import_hunts(_synthetic_hunt_lines(size), creator)
+        seconds = time.perf_counter() - start
+        yield (
+            "import",
+            f"{seconds:.1f} s, {totals['clues'] / seconds:,.0f} clues/s, "
+            f"peak RSS +{(_memory_status_kb('VmHWM') - baseline) / 1024:.0f} MB",
+        )
+
+        sink = _CountingSink()
+        _reset_peak_rss()
+        baseline = _memory_status_kb("VmRSS")
+        start = time.perf_counter()
+        export_hunts(sink, TreasureHunt.objects.filter(creator=creator))
+        seconds = time.perf_counter() - start
+        yield (
+            "export",
+            f"{seconds:.1f} s, {totals['clues'] / seconds:,.0f} clues/s, "
+            f"peak RSS +{(_memory_status_kb('VmHWM') - baseline) / 1024:.0f} MB",
+        )
+        yield "stream size", f"{sink.size / 2**20:.1f} MB"
+
+        transaction.set_rollback(True)
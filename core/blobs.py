@@ -0,0 +1,172 @@
+"""
+Content-addressed storage of the optimized hunt and clue images.
+
+An optimized image is stored once under BLOBS_PREFIX, at a key derived from the
+SHA-256 digest of its bytes, and recorded as an ImageBlob counting the hunts
+and clues using it. Processing an upload first looks for a blob optimized from
+a file with the same digest, which skips both the optimization and the upload;
+otherwise the upload is optimized and a blob with the same optimized bytes is
+reused if there is one. Blobs are released with ImageBlob.release, which only
+deletes the files once no hunt or clue uses them anymore.
+"""
+
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import ImageBlob, image_file_names
+from .storage import delete_files, save_files
+from .utils import image_variants, optimize_image
+
+BLOBS_PREFIX = "images"
+
+# Size of the chunks read when hashing a file
+DIGEST_CHUNK_SIZE = 64 * 1024
+
+
+def file_digest(file):
+    """
+    Return the hex SHA-256 digest of a file, leaving it at its start.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(DIGEST_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def blob_name(digest, ext=".jpg"):
+    """
+    Return the storage name of the image with a digest.
+
+    The first characters of the digest are used as a directory, so that no
+    directory of a file system storage holds too many files.
+    """
+    return f"{BLOBS_PREFIX}/{digest[:2]}/{digest}{ext}"
+
+
+def acquire_blob(digest=None, source_digest=None):
+    """
+    Take a reference to the blob with an optimized or an uploaded image digest.
+
+    Args:
+        digest: SHA-256 digest of the optimized image
+        source_digest: SHA-256 digest of the uploaded file, used if no digest
+            is given
+
+    Returns:
+        ImageBlob: The blob, or None if there is none
+    """
+    if digest:
+        blobs = ImageBlob.objects.filter(digest=digest)
+    else:
+        blobs = ImageBlob.objects.filter(source_digest=source_digest)
+    with transaction.atomic():
+        # Lock the row so that it cannot be released and deleted meanwhile
+        blob = blobs.select_for_update().first()
+        if blob is not None:
+            ImageBlob.objects.filter(pk=blob.pk).update(
+                references=F("references") + 1
+            )
+    return blob
+
+
+def store_image_variants(image_name, variants):
+    """
+    Save the variants generated by image_variants next to their image.
+
+    Args:
+        image_name: Storage name of the image
+        variants: The variants returned by image_variants
+
+    Returns:
+        dict: For each variant name, its "width", "height" and the storage
+        name of its file in each format
+    """
+    root = os.path.splitext(image_name)[0]
+    # Variants of the same size are only saved once
+    unique = list({id(variant): variant for variant in variants.values()}.values())
+    files = [
+        (variant, image_format, variant_file)
+        for variant in unique
+        for image_format, variant_file in variant["files"].items()
+    ]
+    names = save_files(
+        (
+            f"{root}_{variant['width']}w{os.path.splitext(variant_file.name)[1]}",
+            variant_file,
+        )
+        for variant, _, variant_file in files
+    )
+
+    entries = {
+        id(variant): {"width": variant["width"], "height": variant["height"]}
+        for variant in unique
+    }
+    for (variant, image_format, _), name in zip(files, names):
+        entries[id(variant)][image_format] = name
+    return {name: entries[id(variant)] for name, variant in variants.items()}
+
+
+def store_blob(optimized, source_digest=""):
+    """
+    Store an optimized image and its responsive variants, unless an image with
+    the same bytes is already stored.
+
+    Args:
+        optimized: The optimized image file, as returned by optimize_image
+        source_digest: SHA-256 digest of the uploaded file it was optimized from
+
+    Returns:
+        ImageBlob: The blob of the image, with a reference taken for the caller
+    """
+    digest = file_digest(optimized)
+    blob = acquire_blob(digest=digest)
+    if blob is not None:
+        return blob
+
+    variants = image_variants(optimized)
+    optimized.seek(0)
+    name = default_storage.save(
+        blob_name(digest, os.path.splitext(optimized.name)[1]), optimized
+    )
+    stored_variants = store_image_variants(name, variants)
+    try:
+        with transaction.atomic():
+            return ImageBlob.objects.create(
+                digest=digest,
+                source_digest=source_digest,
+                image=name,
+                variants=stored_variants,
+            )
+    except IntegrityError:
+        # Another worker stored the same image meanwhile
+        blob = acquire_blob(digest=digest)
+        if blob is None:
+            raise
+        # Storages that do not overwrite files saved ours under other names
+        if name != blob.image:
+            delete_files(image_file_names(name, stored_variants))
+        return blob
+
+
+def blob_for_upload(source):
+    """
+    Return the blob of the image optimized from an uploaded file, optimizing
+    and storing it only if it is not stored yet.
+
+    Args:
+        source: The uploaded file
+
+    Returns:
+        ImageBlob: The blob of the image, with a reference taken for the caller
+    """
+    source_digest = file_digest(source)
+    blob = acquire_blob(source_digest=source_digest)
+    if blob is not None:
+        return blob
+    return store_blob(optimize_image(source), source_digest)
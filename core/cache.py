@@ -0,0 +1,224 @@
+"""
+Versioned cache for the hunt catalog.
+
+Cached entries are never deleted explicitly. Instead, every key embeds the
+current value of a version key, and the version keys are bumped from model
+signals (see core.models) whenever the data behind them changes:
+
+- CATALOG_VERSION_KEY: bumped when a TreasureHunt or a Clue is saved or deleted
+- progress_version_key(user_id): bumped when one of the user's UserProgress rows
+  is saved or deleted
+
+Stale entries simply stop being read and expire on their own. The cache backend
+is the one configured under settings.HUNT_CACHE_ALIAS, so any Django cache
+backend can be plugged in.
+
+The version keys live in the cache itself, so production needs a backend
+shared by every process (see core.checks): with a backend local to each
+process, such as the default in-memory one, a bump is only seen by the process
+making it, while hunts and clues are also changed by the job workers and the
+management commands. Deployments that cannot share a cache can opt in to
+HUNT_CACHE_DATABASE_VERSIONS, which keeps the version keys in the database
+(see CacheVersion) at the cost of a query per read and a row write per bump.
+"""
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import F
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+class CacheStats:
+    """
+    Thread-safe hit/miss counters for the cache namespaces of this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, namespace, hits=0, misses=0):
+        """
+        Add hits and misses to the counters of a namespace.
+        """
+        with self._lock:
+            counts = self._counts.setdefault(namespace, {"hits": 0, "misses": 0})
+            counts["hits"] += hits
+            counts["misses"] += misses
+
+    def snapshot(self):
+        """
+        Return a copy of the counters, including the hit ratio of each namespace.
+        """
+        with self._lock:
+            result = {}
+            for namespace, counts in self._counts.items():
+                total = counts["hits"] + counts["misses"]
+                result[namespace] = {
+                    **counts,
+                    "hit_ratio": counts["hits"] / total if total else 0.0,
+                }
+            return result
+
+    def reset(self):
+        """
+        Reset all the counters.
+        """
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    """
+    Return the cache backend used for the hunt catalog.
+    """
+    return caches[settings.HUNT_CACHE_ALIAS]
+
+
+def is_shared_cache():
+    """
+    Return whether the hunt cache is shared by every process, rather than
+    local to each one like the in-memory and dummy backends.
+    """
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+def _uses_database_versions():
+    return settings.HUNT_CACHE_DATABASE_VERSIONS and not is_shared_cache()
+
+
+def progress_version_key(user_id):
+    """
+    Return the version key of the progress of a user.
+    """
+    return f"progress:{user_id}:version"
+
+
+def _initial_version():
+    # Versions start from the current time in milliseconds so that a version
+    # key evicted from the cache never restarts below a value already used.
+    return int(time.time() * 1000)
+
+
+def get_versions(*keys):
+    """
+    Return the current value of several version keys in one cache round trip.
+
+    Missing version keys are initialized.
+
+    Returns:
+        list: The versions, in the same order as the keys
+    """
+    if _uses_database_versions():
+        return _get_database_versions(keys)
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = _initial_version()
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def _get_database_versions(keys):
+    from .models import CacheVersion
+
+    versions = dict(
+        CacheVersion.objects.filter(key__in=keys).values_list("key", "version")
+    )
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        CacheVersion.objects.bulk_create(
+            [CacheVersion(key=key, version=_initial_version()) for key in missing],
+            ignore_conflicts=True,
+        )
+        versions.update(
+            CacheVersion.objects.filter(key__in=missing).values_list("key", "version")
+        )
+    return [versions[key] for key in keys]
+
+
+def _bump_database_version(key):
+    from .models import CacheVersion
+
+    if not CacheVersion.objects.filter(key=key).update(version=F("version") + 1):
+        CacheVersion.objects.get_or_create(
+            key=key, defaults={"version": _initial_version()}
+        )
+
+
+def bump_version(key):
+    """
+    Increment a version key, invalidating every entry built with its old value.
+    """
+    if _uses_database_versions():
+        _bump_database_version(key)
+        return None
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog page and hunt card.
+    """
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def bump_progress_version(user_id):
+    """
+    Invalidate the cached progress summary of a user.
+    """
+    return bump_version(progress_version_key(user_id))
+
+
+def digest(*parts):
+    """
+    Return a short stable digest of the given values, suitable for a cache key.
+    """
+    raw = "\x1f".join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_many(namespace, keys):
+    """
+    Fetch several entries in one round trip and record hits and misses.
+
+    Args:
+        namespace: Name under which the hits and misses are counted
+        keys: Cache keys to fetch
+
+    Returns:
+        dict: The entries found, by key
+    """
+    found = get_cache().get_many(keys) if keys else {}
+    stats.record(namespace, hits=len(found), misses=len(keys) - len(found))
+    return found
+
+
+def set_many(entries):
+    """
+    Store several entries in one round trip.
+
+    Entries expire after HUNT_CACHE_TIMEOUT seconds, which is kept below the
+    expiration of signed media URLs embedded in the rendered fragments.
+    """
+    if entries:
+        get_cache().set_many(entries, timeout=settings.HUNT_CACHE_TIMEOUT)
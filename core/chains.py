@@ -0,0 +1,136 @@
+"""
+In-process cache of the compiled clue chains of the hunts being played.
+
+A clue chain holds, in order, the few attributes of the clues of a hunt that
+location verification needs, stored as compact arrays. Chains are tagged with
+the clues_version of their hunt, which is bumped in the database whenever one
+of its clues is saved or deleted (see core.models), so every process notices
+the change the next time it loads the hunt and rebuilds the chain. Since the
+hunt is already loaded with the user's progress, verifying a location needs
+no clue query at all while the chain is cached.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .geo import count_solved_clues, haversine_m
+
+
+class ClueChain:
+    """
+    Ordered, read-only arrays describing the clues of a hunt.
+    """
+
+    __slots__ = (
+        "version",
+        "ids",
+        "latitudes",
+        "longitudes",
+        "radii",
+        "unlock_messages",
+        "_positions",
+    )
+
+    def __init__(self, version, rows):
+        """
+        Build the chain from (id, latitude, longitude, radius, unlock_message) rows
+        sorted by clue order.
+        """
+        self.version = version
+        self.ids = tuple(row[0] for row in rows)
+        self.latitudes = np.array([row[1] for row in rows], dtype=np.float64)
+        self.longitudes = np.array([row[2] for row in rows], dtype=np.float64)
+        self.radii = np.array([row[3] for row in rows], dtype=np.float64)
+        self.unlock_messages = tuple(row[4] for row in rows)
+        self._positions = {clue_id: i for i, clue_id in enumerate(self.ids)}
+
+    @classmethod
+    def load(cls, hunt):
+        """
+        Build the chain of a hunt from the database.
+        """
+        rows = hunt.clues.order_by("order").values_list(
+            "id", "latitude", "longitude", "radius", "unlock_message"
+        )
+        return cls(hunt.clues_version, list(rows))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def position(self, clue_id):
+        """
+        Return the position of a clue in the chain, or None if it is not part of it.
+        """
+        return self._positions.get(clue_id)
+
+    def next_id(self, position):
+        """
+        Return the id of the clue after the given position, or None for the last clue.
+        """
+        return self.ids[position + 1] if position + 1 < len(self.ids) else None
+
+    def target(self, position):
+        """
+        Return the latitude, longitude and radius of the clue at a position.
+        """
+        return (
+            float(self.latitudes[position]),
+            float(self.longitudes[position]),
+            float(self.radii[position]),
+        )
+
+    def is_solved_by(self, position, lat, lng):
+        """
+        Check whether a single GPS fix is within the radius of the clue at a position.
+        """
+        distance = haversine_m(
+            self.latitudes[position], self.longitudes[position], lat, lng
+        )
+        return distance <= self.radii[position]
+
+    def count_solved(self, position, lats, lngs):
+        """
+        Count how many consecutive clues, starting at a position, a trail of fixes solves.
+        """
+        return count_solved_clues(
+            self.latitudes[position:],
+            self.longitudes[position:],
+            self.radii[position:],
+            lats,
+            lngs,
+        )
+
+
+_chains = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_clue_chain(hunt, refresh=False):
+    """
+    Return the clue chain of a hunt, building it if it is missing or outdated.
+
+    Args:
+        hunt: The TreasureHunt, whose clues_version identifies the chain
+        refresh: Rebuild the chain even if a cached one looks current
+
+    Returns:
+        ClueChain: The chain of the hunt
+    """
+    if not refresh:
+        with _lock:
+            chain = _chains.get(hunt.pk)
+            if chain is not None and chain.version == hunt.clues_version:
+                _chains.move_to_end(hunt.pk)
+                return chain
+
+    chain = ClueChain.load(hunt)
+    with _lock:
+        _chains[hunt.pk] = chain
+        _chains.move_to_end(hunt.pk)
+        while len(_chains) > settings.CLUE_CHAIN_CACHE_SIZE:
+            _chains.popitem(last=False)
+    return chain
+
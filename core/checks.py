@@ -0,0 +1,52 @@
+"""
+System checks of the core app.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from .cache import is_shared_cache
+
+
+@register(Tags.caches)
+def check_hunt_cache(app_configs, **kwargs):
+    """
+    Warn when the hunt cache is local to each process outside of DEBUG.
+    """
+    if settings.DEBUG or is_shared_cache():
+        return []
+    return [
+        Warning(
+            f"The {settings.HUNT_CACHE_ALIAS!r} cache is local to each process.",
+            hint=(
+                "Each process throttles location checks on its own and, unless "
+                "HUNT_CACHE_DATABASE_VERSIONS is set, only invalidates the "
+                "cached hunts and progress it changed itself. Set "
+                "HUNT_CACHE_BACKEND to a backend shared by every process."
+            ),
+            id="core.W001",
+        )
+    ]
+
+
+@register()
+def check_throttle_rates(app_configs, **kwargs):
+    """
+    Check the token buckets of the location and photo checks (see core.throttle).
+    """
+    errors = []
+    for name in ("LOCATION_CHECK", "PHOTO_CHECK"):
+        rate = getattr(settings, f"{name}_RATE")
+        burst = getattr(settings, f"{name}_BURST")
+        if rate < 0:
+            errors.append(
+                Error(
+                    f"{name}_RATE must be positive, or 0 to disable the throttle.",
+                    id="core.E001",
+                )
+            )
+        elif rate and burst < 1:
+            errors.append(
+                Error(f"{name}_BURST must be at least 1.", id="core.E002")
+            )
+    return errors
@@ -0,0 +1,188 @@
+"""
+Geographic helpers for the core app.
+
+Distances are great-circle distances computed with the haversine formula on a
+spherical Earth, which is accurate to about 0.5% and more than enough to tell
+whether a player stands within a few metres of a clue.
+"""
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_000
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """
+    Return the great-circle distance in metres between two points.
+
+    Args:
+        lat1, lng1: Coordinates of the first point, in degrees
+        lat2, lng2: Coordinates of the second point, in degrees
+
+    Returns:
+        float: The distance in metres
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_many_m(lat, lng, lats, lngs):
+    """
+    Return the great-circle distances in metres from one point to many points.
+
+    Args:
+        lat, lng: Coordinates of the reference point, in degrees
+        lats, lngs: Sequences or arrays with the coordinates of the other points
+
+    Returns:
+        numpy.ndarray: The distances in metres, one per point
+    """
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+    a = (
+        np.sin(d_phi / 2) ** 2
+        + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def count_solved_clues(clue_lats, clue_lngs, clue_radii, lats, lngs):
+    """
+    Count how many consecutive clues a chronological trail of GPS fixes solves.
+
+    Each clue must be solved by a fix that comes after the one that solved the
+    previous clue, so a single fix never solves two clues.
+
+    Args:
+        clue_lats, clue_lngs, clue_radii: Locations and radii of the current
+            clue followed by the next ones, in order
+        lats, lngs: Sequences or arrays with the coordinates of the fixes,
+            sorted by time
+
+    Returns:
+        int: Number of clues solved, from the start of the list
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    start = 0
+    solved = 0
+    for clue_lat, clue_lng, radius in zip(clue_lats, clue_lngs, clue_radii):
+        if start >= len(lats):
+            break
+        mask = haversine_many_m(clue_lat, clue_lng, lats[start:], lngs[start:]) <= radius
+        if not mask.any():
+            break
+        start += int(mask.argmax()) + 1
+        solved += 1
+    return solved
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    """
+    Encode a location as a geohash.
+
+    Locations sharing a geohash prefix lie in the same cell, so a prefix
+    lookup on an indexed geohash column finds the points of a cell without
+    scanning the table.
+
+    Args:
+        lat, lng: Coordinates of the location, in degrees
+        precision: Number of characters of the geohash
+
+    Returns:
+        str: The geohash of the location
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if lng >= mid:
+                value = (value << 1) | 1
+                lng_range[0] = mid
+            else:
+                value <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision):
+    """
+    Return the height and width in degrees of the geohash cells of a precision.
+    """
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lng_bits = total_bits - lat_bits
+    return 180.0 / 2**lat_bits, 360.0 / 2**lng_bits
+
+
+def geohash_cells(lat, lng, radius_m):
+    """
+    Return the geohash prefixes of the cells covering a circle.
+
+    The circle is covered by the cell containing its center and the eight
+    cells around it, using the finest precision whose cells are at least as
+    large as the radius.
+
+    Args:
+        lat, lng: Coordinates of the center, in degrees
+        radius_m: Radius of the circle, in metres
+
+    Returns:
+        list: The distinct prefixes of the covering cells, or None if the
+        circle is too large to be covered by geohash cells
+    """
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        if (
+            height * METERS_PER_DEGREE >= radius_m
+            and width * METERS_PER_DEGREE * cos_lat >= radius_m
+        ):
+            break
+    else:
+        return None
+
+    prefixes = []
+    for d_lat in (-height, 0, height):
+        for d_lng in (-width, 0, width):
+            cell_lat = min(90.0, max(-90.0, lat + d_lat))
+            cell_lng = (lng + d_lng + 180.0) % 360.0 - 180.0
+            prefix = geohash_encode(cell_lat, cell_lng, precision)
+            if prefix not in prefixes:
+                prefixes.append(prefix)
+    return prefixes
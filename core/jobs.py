@@ -0,0 +1,646 @@
+"""
+Database-backed queue of the background jobs of the core app.
+
+Uploaded images are stored as they are under UPLOADS_PREFIX and a Job row is
+queued for them, so the request returns without optimizing or embedding
+anything. Workers started with the process_jobs management command claim
+pending jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number of threads
+and processes can share the queue without a broker and without running a job
+twice. A failed job is retried JOB_MAX_ATTEMPTS times with an increasing
+delay, and jobs left running by a worker that died are queued again after
+JOB_TIMEOUT seconds. Done jobs are kept JOB_RETENTION seconds, long enough to
+tell whether an older upload of the same image has been superseded.
+
+On S3, images are instead uploaded by the browser straight to the bucket
+(see presign_uploads), and the jobs are queued once the browser reports the
+uploads as finished (see enqueue_direct_uploads).
+
+Embedding jobs share the queue but are left to a separate, long-lived worker
+started with the embed_clues management command, which loads the CLIP model
+once and embeds the images of EMBEDDING_BATCH_SIZE jobs per inference.
+"""
+
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .blobs import blob_for_upload
+from .models import (
+    Clue,
+    ImageBlob,
+    Job,
+    TreasureHunt,
+    clue_image_path,
+    hunt_image_path,
+)
+from .storage import delete_files, missing_files, presigned_upload, save_files
+from .utils import generate_image_embeddings, load_clip, load_embedding_image
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_PREFIX = "uploads"
+UPLOAD_TOKEN_SALT = "core.jobs.direct_upload"
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """
+    Register the function running the jobs of a kind.
+    """
+
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+
+    return decorator
+
+
+def _upload_name(uploaded_file):
+    ext = os.path.splitext(uploaded_file.name)[1].lower()
+    return f"{UPLOADS_PREFIX}/{uuid.uuid4()}{ext}"
+
+
+def enqueue(kind, hunt, clue=None, source=""):
+    """
+    Queue a job.
+
+    Args:
+        kind: One of the Job kinds
+        hunt: The TreasureHunt the job belongs to
+        clue: The Clue the job processes, if any
+        source: Storage name of the uploaded file to process, if any
+
+    Returns:
+        Job: The queued job
+    """
+    return Job.objects.create(kind=kind, treasure_hunt=hunt, clue=clue, source=source)
+
+
+def enqueue_uploads(hunt, uploads):
+    """
+    Store uploaded images as they are and queue a job processing each of them.
+
+    The files are uploaded to the storage concurrently and the jobs are
+    inserted with a single query.
+
+    Args:
+        hunt: The TreasureHunt the images belong to
+        uploads: Sequence of (kind, clue, uploaded_file) tuples, where clue
+            is None for the main image of the hunt
+
+    Returns:
+        list: The queued jobs
+    """
+    uploads = list(uploads)
+    sources = save_files(
+        (_upload_name(uploaded_file), uploaded_file) for _, _, uploaded_file in uploads
+    )
+    return Job.objects.bulk_create(
+        Job(kind=kind, treasure_hunt=hunt, clue=clue, source=source)
+        for (kind, clue, _), source in zip(uploads, sources)
+    )
+
+
+def presign_uploads(hunt, files):
+    """
+    Prepare the direct upload of images to the storage.
+
+    Each image gets a presigned upload form for a key of its final location
+    and a signed token identifying the upload, to be passed back to
+    enqueue_direct_uploads once the file is uploaded.
+
+    Args:
+        hunt: The TreasureHunt the images belong to
+        files: Sequence of (clue, filename, content_type) tuples, where clue
+            is None for the main image of the hunt
+
+    Returns:
+        list: For each file, the "url" and "fields" of its upload form and its "token"
+    """
+    uploads = []
+    for clue, filename, content_type in files:
+        if clue:
+            source = clue_image_path(clue, filename)
+        else:
+            source = hunt_image_path(hunt, filename)
+        upload = presigned_upload(source, content_type)
+        upload["token"] = signing.dumps(
+            {
+                "hunt": str(hunt.pk),
+                "clue": str(clue.pk) if clue else None,
+                "source": source,
+            },
+            salt=UPLOAD_TOKEN_SALT,
+        )
+        uploads.append(upload)
+    return uploads
+
+
+def enqueue_direct_uploads(hunt, tokens):
+    """
+    Queue a job processing each image uploaded directly to the storage.
+
+    Tokens of uploads that already have a job are ignored, so finalizing
+    the same uploads twice is harmless.
+
+    Args:
+        hunt: The TreasureHunt the images belong to
+        tokens: The tokens returned by presign_uploads for the uploaded images
+
+    Returns:
+        list: The queued jobs
+
+    Raises:
+        ValueError: If a token is invalid, expired or issued for another hunt,
+        or if its file has not been uploaded
+    """
+    clue_ids = {str(clue_id) for clue_id in hunt.clues.values_list("id", flat=True)}
+    uploads = {}
+    for token in tokens:
+        try:
+            # Leave time to finish an upload started just before its form expired
+            upload = signing.loads(
+                token, salt=UPLOAD_TOKEN_SALT, max_age=2 * settings.UPLOAD_URL_EXPIRE
+            )
+        except signing.BadSignature:
+            raise ValueError("Invalid or expired upload token")
+        if upload["hunt"] != str(hunt.pk) or (
+            upload["clue"] and upload["clue"] not in clue_ids
+        ):
+            raise ValueError("Upload token issued for another hunt")
+        uploads[upload["source"]] = upload
+
+    for source in Job.objects.filter(source__in=uploads).values_list(
+        "source", flat=True
+    ):
+        del uploads[source]
+    if missing_files(uploads):
+        raise ValueError("Some images have not been uploaded")
+
+    return Job.objects.bulk_create(
+        Job(
+            kind=Job.CLUE_IMAGE if upload["clue"] else Job.HUNT_IMAGE,
+            treasure_hunt=hunt,
+            clue_id=upload["clue"],
+            source=upload["source"],
+        )
+        for upload in uploads.values()
+    )
+
+
+def claim_jobs(kinds, limit=1):
+    """
+    Mark the oldest runnable jobs of some kinds as running and return them.
+
+    Args:
+        kinds: The Job kinds to claim
+        limit: Maximum number of jobs claimed
+
+    Returns:
+        list: The claimed jobs, empty if there is none
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(kind__in=kinds, status=Job.PENDING, run_after__lte=now)
+            .order_by("run_after", "created_at")[:limit]
+        )
+        for job in jobs:
+            job.status = Job.RUNNING
+            job.attempts += 1
+            job.started_at = now
+        Job.objects.bulk_update(jobs, ["status", "attempts", "started_at"])
+    return jobs
+
+
+def claim_job():
+    """
+    Mark the oldest runnable job run by the job workers as running and return
+    it, or None if there is none.
+
+    Embedding jobs are left to the embedding worker (see work_embeddings).
+    """
+    jobs = claim_jobs(list(HANDLERS))
+    return jobs[0] if jobs else None
+
+
+def clean_up_jobs():
+    """
+    Queue again the jobs left running longer than JOB_TIMEOUT by a worker that
+    died, and delete the jobs done more than JOB_RETENTION seconds ago.
+    """
+    now = timezone.now()
+    requeued = Job.objects.filter(
+        status=Job.RUNNING, started_at__lt=now - timedelta(seconds=settings.JOB_TIMEOUT)
+    ).update(status=Job.PENDING)
+    if requeued:
+        logger.warning("Queued again %d stale jobs", requeued)
+    Job.objects.filter(
+        status=Job.DONE,
+        finished_at__lt=now - timedelta(seconds=settings.JOB_RETENTION),
+    ).delete()
+
+
+def _record_outcome(job, error=None):
+    # A failed job is retried with an exponential backoff until JOB_MAX_ATTEMPTS
+    job.finished_at = timezone.now()
+    if error is None:
+        job.status = Job.DONE
+        job.error = ""
+    else:
+        job.error = str(error)
+        if job.attempts < settings.JOB_MAX_ATTEMPTS:
+            job.status = Job.PENDING
+            job.run_after = job.finished_at + timedelta(
+                seconds=settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            )
+        else:
+            job.status = Job.FAILED
+    # The job is deleted along with its hunt or clue, possibly while it runs
+    updated = Job.objects.filter(pk=job.pk).update(
+        status=job.status,
+        error=job.error,
+        finished_at=job.finished_at,
+        run_after=job.run_after,
+    )
+    if not updated:
+        logger.info("Job %s (%s) was deleted while running", job.pk, job.kind)
+
+
+def run_job(job):
+    """
+    Run a claimed job and record its outcome.
+    """
+    try:
+        HANDLERS[job.kind](job)
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job.pk, job.kind)
+        _record_outcome(job, e)
+    else:
+        _record_outcome(job)
+
+
+def work(stop, poll_interval=None):
+    """
+    Run jobs until the stop event is set, waiting when the queue is empty.
+
+    Args:
+        stop: A threading.Event stopping the loop once set
+        poll_interval: Seconds to wait when there is no job, JOB_POLL_INTERVAL by default
+
+    Returns:
+        int: Number of jobs run
+    """
+    poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+    count = 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                job = claim_job()
+                if job is None:
+                    stop.wait(poll_interval)
+                    continue
+                run_job(job)
+                count += 1
+            except Exception:
+                # Keep the worker alive, e.g. while the database is unreachable
+                logger.exception("Job worker error")
+                stop.wait(poll_interval)
+    finally:
+        close_old_connections()
+    return count
+
+
+def run_workers(concurrency, stop=None, poll_interval=None):
+    """
+    Run a pool of worker threads sharing the queue until the stop event is set.
+
+    Returns:
+        int: Number of jobs run
+    """
+    stop = stop or threading.Event()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(work, stop, poll_interval) for _ in range(concurrency)
+        ]
+        try:
+            clean_up_jobs()
+            while not stop.wait(settings.JOB_TIMEOUT):
+                clean_up_jobs()
+        finally:
+            stop.set()
+            close_old_connections()
+    return sum(future.result() for future in futures)
+
+
+def run_pending_jobs():
+    """
+    Run the runnable jobs in this thread until the queue is empty.
+
+    Returns:
+        int: Number of jobs run
+    """
+    clean_up_jobs()
+    count = 0
+    while (job := claim_job()) is not None:
+        run_job(job)
+        count += 1
+    return count
+
+
+def _is_superseded(job):
+    # A newer upload for the same image makes this one obsolete
+    return (
+        Job.objects.filter(
+            kind=job.kind,
+            treasure_hunt_id=job.treasure_hunt_id,
+            clue_id=job.clue_id,
+            created_at__gt=job.created_at,
+        )
+        .exclude(pk=job.pk)
+        .exists()
+    )
+
+
+def _blob_for_source(job):
+    with default_storage.open(job.source) as source:
+        return blob_for_upload(source)
+
+
+@handler(Job.HUNT_IMAGE)
+def process_hunt_image(job):
+    """
+    Optimize the uploaded main image of a hunt, generate its responsive
+    variants and make it the image of the hunt.
+
+    Images already stored, for this hunt or another one, are reused as they
+    are (see core.blobs).
+    """
+    blob = _blob_for_source(job)
+    try:
+        with transaction.atomic():
+            # The hunt may have been deleted since the job was claimed
+            hunt = (
+                TreasureHunt.objects.select_for_update()
+                .filter(pk=job.treasure_hunt_id)
+                .first()
+            )
+            # Nothing changes when the current image is uploaded again
+            if hunt is None or _is_superseded(job) or blob.pk == hunt.image_blob_id:
+                released = [blob.pk]
+            else:
+                released = hunt.set_image(blob)
+                hunt.save(update_fields=["image", "image_variants", "image_blob"])
+    except Exception:
+        ImageBlob.release([blob.pk])
+        raise
+    ImageBlob.release(released)
+    delete_files([job.source])
+
+
+@handler(Job.CLUE_IMAGE)
+def process_clue_image(job):
+    """
+    Optimize the uploaded reference image of a clue, generate its responsive
+    variants, make it the image of the clue and queue the computation of its
+    embedding, unless the image was already embedded for another clue.
+
+    Images already stored, for this clue or another one, are reused as they
+    are (see core.blobs).
+    """
+    blob = _blob_for_source(job)
+    try:
+        with transaction.atomic():
+            # The clue may have been deleted since the job was claimed
+            clue = Clue.objects.select_for_update().filter(pk=job.clue_id).first()
+            # Nothing changes when the current image is uploaded again
+            if (
+                clue is None
+                or _is_superseded(job)
+                or blob.pk == clue.reference_image_blob_id
+            ):
+                released = [blob.pk]
+            else:
+                released = clue.set_reference_image(blob)
+                # Images already embedded for another clue are not embedded again
+                clue.image_embedding = blob.embedding
+                clue.save(
+                    update_fields=[
+                        "reference_image",
+                        "reference_image_variants",
+                        "reference_image_blob",
+                        "image_embedding",
+                    ]
+                )
+                if settings.IMAGE_EMBEDDINGS_ENABLED and blob.embedding is None:
+                    enqueue(
+                        Job.CLUE_EMBEDDING, TreasureHunt(pk=clue.treasure_hunt_id), clue
+                    )
+    except Exception:
+        ImageBlob.release([blob.pk])
+        raise
+    ImageBlob.release(released)
+    delete_files([job.source])
+
+
+def _embedding_source(clue):
+    # CLIP only looks at 224 pixels, the thumbnail is enough and much faster
+    # to download and decode than the full image
+    thumbnail = clue.reference_image_variants.get("thumbnail", {})
+    return thumbnail.get("jpeg") or clue.reference_image.name
+
+
+def _load_clue_image(clue):
+    with default_storage.open(_embedding_source(clue)) as image_file:
+        image = load_embedding_image(image_file)
+        image.load()
+    return image
+
+
+def embed_clue_images(jobs):
+    """
+    Compute the embeddings of the reference images of the clues of a batch of
+    embedding jobs, with a single inference of the model.
+
+    Embeddings are cached on the ImageBlob of the images, so an image used by
+    several clues is only embedded once. The images are read from the storage
+    concurrently. Jobs superseded by a newer one for the same clue are skipped,
+    and so are the clues whose image changed while the model was running.
+    """
+    clues = Clue.objects.in_bulk(job.clue_id for job in jobs)
+    clues = [
+        clues[job.clue_id]
+        for job in jobs
+        if job.clue_id in clues
+        and clues[job.clue_id].reference_image
+        and not _is_superseded(job)
+    ]
+    if not clues:
+        return
+    blobs = ImageBlob.objects.in_bulk(
+        {clue.reference_image_blob_id for clue in clues} - {None}
+    )
+
+    # Clues sharing an image share its embedding
+    pending = {}
+    for clue in clues:
+        blob = blobs.get(clue.reference_image_blob_id)
+        if blob is not None and blob.embedding is not None:
+            clue.image_embedding = blob.embedding
+        else:
+            pending.setdefault(clue.reference_image_blob_id or clue.pk, []).append(clue)
+
+    if pending:
+        with ThreadPoolExecutor(
+            max_workers=min(settings.STORAGE_MAX_WORKERS, len(pending))
+        ) as executor:
+            images = list(
+                executor.map(_load_clue_image, [group[0] for group in pending.values()])
+            )
+        embedded_blobs = []
+        for (key, group), embedding in zip(
+            pending.items(), generate_image_embeddings(images)
+        ):
+            for clue in group:
+                clue.image_embedding = embedding
+            if key in blobs:
+                blobs[key].embedding = embedding
+                embedded_blobs.append(blobs[key])
+        ImageBlob.objects.bulk_update(embedded_blobs, ["embedding"])
+
+    with transaction.atomic():
+        # The image of a clue may have been removed or replaced during the
+        # inference: its embedding is then left to the job of the new image
+        current = Clue.objects.select_for_update().only(
+            "id", "reference_image", "reference_image_blob"
+        ).in_bulk([clue.pk for clue in clues])
+        clues = [
+            clue
+            for clue in clues
+            if clue.pk in current
+            and current[clue.pk].reference_image_blob_id
+            == clue.reference_image_blob_id
+            and current[clue.pk].reference_image.name == clue.reference_image.name
+        ]
+        if not clues:
+            return
+        # The embedding is not part of the cached catalog nor of the clue
+        # chains, so the post_save signals are skipped and only the centroids
+        # are updated
+        Clue.objects.bulk_update(clues, ["image_embedding"])
+        TreasureHunt.objects.filter(
+            pk__in={clue.treasure_hunt_id for clue in clues}
+        ).refresh_centroids()
+
+
+def run_embedding_jobs(jobs):
+    """
+    Run a batch of claimed embedding jobs and record their outcome.
+    """
+    try:
+        embed_clue_images(jobs)
+    except Exception as e:
+        logger.exception("Batch of %d embedding jobs failed", len(jobs))
+        for job in jobs:
+            _record_outcome(job, e)
+    else:
+        for job in jobs:
+            _record_outcome(job)
+
+
+def work_embeddings(stop, batch_size=None, poll_interval=None):
+    """
+    Run embedding jobs in batches until the stop event is set, waiting when
+    there is none.
+
+    The model is loaded before the first batch and kept for the life of the
+    process, so this is meant to run in a long-lived worker (see the
+    embed_clues management command).
+
+    Args:
+        stop: A threading.Event stopping the loop once set
+        batch_size: Maximum number of images per inference, EMBEDDING_BATCH_SIZE
+            by default
+        poll_interval: Seconds to wait when there is no job, JOB_POLL_INTERVAL by default
+
+    Returns:
+        int: Number of jobs run
+    """
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+    load_clip()
+    count = 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                jobs = claim_jobs([Job.CLUE_EMBEDDING], batch_size)
+                if not jobs:
+                    stop.wait(poll_interval)
+                    continue
+                run_embedding_jobs(jobs)
+                count += len(jobs)
+            except Exception:
+                # Keep the worker alive, e.g. while the database is unreachable
+                logger.exception("Embedding worker error")
+                stop.wait(poll_interval)
+    finally:
+        close_old_connections()
+    return count
+
+
+def run_pending_embeddings(batch_size=None):
+    """
+    Run the runnable embedding jobs in batches until there is none left.
+
+    Returns:
+        int: Number of jobs run
+    """
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    count = 0
+    while jobs := claim_jobs([Job.CLUE_EMBEDDING], batch_size):
+        run_embedding_jobs(jobs)
+        count += len(jobs)
+    return count
+
+
+def enqueue_missing_embeddings():
+    """
+    Queue an embedding job for each clue with a reference image but no
+    embedding that is not already waiting for one.
+
+    Returns:
+        list: The queued jobs
+    """
+    clues = (
+        Clue.objects.filter(image_embedding__isnull=True)
+        .exclude(reference_image__isnull=True)
+        .exclude(reference_image="")
+        .exclude(
+            Exists(
+                Job.objects.filter(
+                    clue=OuterRef("pk"),
+                    kind=Job.CLUE_EMBEDDING,
+                    status__in=[Job.PENDING, Job.RUNNING],
+                )
+            )
+        )
+        .only("id", "treasure_hunt_id")
+    )
+    return Job.objects.bulk_create(
+        Job(kind=Job.CLUE_EMBEDDING, treasure_hunt_id=clue.treasure_hunt_id, clue=clue)
+        for clue in clues.iterator()
+    )
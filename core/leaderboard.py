@@ -0,0 +1,202 @@
+"""
+Real-time leaderboards of the hunts, pushed to spectators as server-sent events.
+
+A database trigger (see migration 0012) sends a NOTIFY on the PROGRESS_CHANNEL
+channel, with the hunt id as payload, whenever a UserProgress row changes.
+Each ASGI process keeps a single LISTEN connection shared by every stream it
+serves: notifications received within LEADERBOARD_DEBOUNCE seconds are
+coalesced, the leaderboard of each notified hunt is queried once, and the new
+ranking is pushed to all its spectators only if it changed.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+import psycopg2
+import psycopg2.extensions
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import OuterRef
+
+from .models import UserProgress, clues_before
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CHANNEL = "hunt_progress"
+
+
+def get_leaderboard(hunt_id):
+    """
+    Return the ranking of the participants of a hunt.
+
+    Args:
+        hunt_id: Id of the hunt
+
+    Returns:
+        list: One dict per participant, best first, limited to LEADERBOARD_SIZE
+    """
+    participants = (
+        UserProgress.objects.filter(treasure_hunt_id=hunt_id)
+        .annotate(
+            current_clue_number=clues_before(hunt_id, OuterRef("current_clue__order"))
+            + 1
+        )
+        .order_by("-total_points", "started_at")
+        .values(
+            "user__username",
+            "started_at",
+            "is_completed",
+            "total_points",
+            "current_clue_number",
+            "completed_at",
+        )[: settings.LEADERBOARD_SIZE]
+    )
+    return [
+        {
+            "rank": rank,
+            "username": participant["user__username"],
+            "started_at": participant["started_at"].isoformat(),
+            "is_completed": participant["is_completed"],
+            "total_points": participant["total_points"],
+            "current_clue_number": participant["current_clue_number"],
+            "completed_at": (
+                participant["completed_at"].isoformat()
+                if participant["completed_at"]
+                else None
+            ),
+        }
+        for rank, participant in enumerate(participants, start=1)
+    ]
+
+
+def format_event(leaderboard):
+    """
+    Format a leaderboard as a server-sent event.
+    """
+    return f"event: leaderboard\ndata: {json.dumps(leaderboard)}\n\n"
+
+
+def _listen():
+    """
+    Open a dedicated autocommit connection listening on PROGRESS_CHANNEL.
+    """
+    params = connections["default"].get_connection_params()
+    connection = psycopg2.connect(**params)
+    connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {PROGRESS_CHANNEL}")
+    return connection
+
+
+class LeaderboardBroadcaster:
+    """
+    Share one LISTEN connection and one query per update among all the
+    spectators of the hunts served by this process.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._latest = {}
+        self._pending = set()
+        self._connection = None
+        self._connecting = None
+        self._flush_task = None
+
+    async def subscribe(self, hunt_id):
+        """
+        Register a spectator of a hunt.
+
+        Returns:
+            tuple: (queue receiving the formatted leaderboard events, current event)
+        """
+        await self._ensure_listening()
+        hunt_id = str(hunt_id)
+        queue = asyncio.Queue(maxsize=settings.LEADERBOARD_QUEUE_SIZE)
+        self._subscribers[hunt_id].add(queue)
+        if hunt_id not in self._latest:
+            leaderboard = await sync_to_async(get_leaderboard)(hunt_id)
+            self._latest[hunt_id] = format_event(leaderboard)
+        return queue, self._latest[hunt_id]
+
+    def unsubscribe(self, hunt_id, queue):
+        """
+        Remove a spectator of a hunt.
+        """
+        hunt_id = str(hunt_id)
+        self._subscribers[hunt_id].discard(queue)
+        if not self._subscribers[hunt_id]:
+            del self._subscribers[hunt_id]
+            self._latest.pop(hunt_id, None)
+
+    async def _ensure_listening(self):
+        if self._connection is not None:
+            return
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            if self._connection is not None:
+                return
+            connection = await sync_to_async(_listen, thread_sensitive=False)()
+            asyncio.get_running_loop().add_reader(
+                connection.fileno(), self._on_notify
+            )
+            self._connection = connection
+
+    def _close(self):
+        try:
+            asyncio.get_running_loop().remove_reader(self._connection.fileno())
+            self._connection.close()
+        except Exception as e:
+            logger.warning("Error closing the leaderboard connection: %s", e)
+        self._connection = None
+        # Spectators will reconnect and open a new connection
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._put(queue, None)
+
+    def _on_notify(self):
+        try:
+            self._connection.poll()
+        except psycopg2.Error as e:
+            logger.warning("Leaderboard connection lost: %s", e)
+            self._close()
+            return
+
+        while self._connection.notifies:
+            hunt_id = self._connection.notifies.pop(0).payload
+            if hunt_id in self._subscribers:
+                self._pending.add(hunt_id)
+        if self._pending and self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        try:
+            await asyncio.sleep(settings.LEADERBOARD_DEBOUNCE)
+            pending, self._pending = self._pending, set()
+            for hunt_id in pending:
+                if hunt_id not in self._subscribers:
+                    continue
+                leaderboard = await sync_to_async(get_leaderboard)(hunt_id)
+                event = format_event(leaderboard)
+                if event == self._latest.get(hunt_id):
+                    continue
+                self._latest[hunt_id] = event
+                for queue in list(self._subscribers.get(hunt_id, ())):
+                    self._put(queue, event)
+        finally:
+            self._flush_task = None
+            if self._pending:
+                self._flush_task = asyncio.ensure_future(self._flush())
+
+    @staticmethod
+    def _put(queue, event):
+        # Slow spectators only need the latest ranking, drop the oldest one
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+
+broadcaster = LeaderboardBroadcaster()
@@ -0,0 +1,30 @@
+"""
+Management command to run the benchmarks of the core app.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    """
+    Run one of the benchmarks registered in core.benchmarks.
+    """
+
+    help = "Run a benchmark of the core app and print its results"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(BENCHMARKS))
+        parser.add_argument(
+            "--size",
+            type=int,
+            help="Problem size (number of fixes, images, rows...) of the benchmark",
+        )
+
+    def handle(self, *args, **options):
+        func = BENCHMARKS[options["name"]]
+        size = options["size"] or func.default_size
+        self.stdout.write(f"{options['name']} (size={size:,})")
+        for label, value in func(size):
+            self.stdout.write(f"  {label:<30} {value}")
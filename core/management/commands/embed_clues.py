@@ -0,0 +1,62 @@
+"""
+Management command to run the embedding worker of the core app.
+"""
+
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import (
+    enqueue_missing_embeddings,
+    run_pending_embeddings,
+    work_embeddings,
+)
+from core.utils import load_clip
+
+
+class Command(BaseCommand):
+    """
+    Compute the embeddings of the clue images queued in core.jobs, in batches,
+    with the CLIP model loaded once for the life of the process.
+    """
+
+    help = "Compute the embeddings of the clue images until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.EMBEDDING_BATCH_SIZE,
+            help="Maximum number of images embedded at once",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Embed the queued images and exit instead of waiting for new ones",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="First queue the images of the clues that have no embedding",
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            jobs = enqueue_missing_embeddings()
+            self.stdout.write(f"{len(jobs)} clue images queued")
+
+        if options["once"]:
+            load_clip()
+            count = run_pending_embeddings(options["batch_size"])
+        else:
+            stop = threading.Event()
+            # Let the running batch finish on Ctrl+C or when the container stops
+            signal.signal(signal.SIGINT, lambda *args: stop.set())
+            signal.signal(signal.SIGTERM, lambda *args: stop.set())
+            self.stdout.write(
+                f"Embedding clue images in batches of {options['batch_size']}"
+            )
+            count = work_embeddings(stop, options["batch_size"])
+        self.stdout.write(f"{count} embedding jobs run")
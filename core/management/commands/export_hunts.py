@@ -0,0 +1,48 @@
+"""
+Management command to export hunts as NDJSON.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand
+
+from core.models import TreasureHunt
+from core.transfer import export_hunts
+
+
+class Command(BaseCommand):
+    """
+    Write hunts and their clues, one NDJSON line per hunt, to a file or to the
+    standard output, to be imported with the import_hunts command.
+    """
+
+    help = "Export hunts and their clues as NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="File the hunts are written to, the standard output by default",
+        )
+        parser.add_argument(
+            "--creator",
+            help="Only export the hunts created by the user with this username",
+        )
+        parser.add_argument(
+            "--progress",
+            action="store_true",
+            help="Also export the progress of the players of each hunt",
+        )
+
+    def handle(self, *args, **options):
+        hunts = TreasureHunt.objects.all()
+        if options["creator"]:
+            hunts = hunts.filter(creator__username=options["creator"])
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as out:
+                count = export_hunts(out, hunts, options["progress"])
+        else:
+            count = export_hunts(sys.stdout, hunts, options["progress"])
+        # The standard output may hold the hunts themselves
+        self.stderr.write(f"{count} hunts exported")
@@ -0,0 +1,43 @@
+"""
+Management command to generate the responsive variants of the existing images.
+"""
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.blobs import store_image_variants
+from core.cache import bump_catalog_version
+from core.models import Clue, ImageBlob, TreasureHunt
+from core.utils import image_variants
+
+
+class Command(BaseCommand):
+    """
+    Generate the variants of the hunt and clue images uploaded before they
+    were generated by the image jobs.
+    """
+
+    help = "Generate the responsive variants of the images that have none"
+
+    def handle(self, *args, **options):
+        count = 0
+        for blob in ImageBlob.objects.filter(variants={}).iterator():
+            try:
+                with default_storage.open(blob.image) as image_file:
+                    variants = image_variants(image_file)
+            except Exception as e:
+                self.stderr.write(f"Error reading {blob.image}: {e}")
+                continue
+            blob.variants = store_image_variants(blob.image, variants)
+            blob.save(update_fields=["variants"])
+            TreasureHunt.objects.filter(image_blob=blob).update(
+                image_variants=blob.variants
+            )
+            Clue.objects.filter(reference_image_blob=blob).update(
+                reference_image_variants=blob.variants
+            )
+            count += 1
+        # update() bypasses the post_save signals invalidating the catalog
+        if count:
+            bump_catalog_version()
+        self.stdout.write(f"Variants generated for {count} images")
@@ -0,0 +1,66 @@
+"""
+Management command to import hunts from NDJSON.
+"""
+
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.transfer import TRANSFER_BATCH_SIZE, import_hunts
+
+
+class Command(BaseCommand):
+    """
+    Create the hunts, clues and progress of an NDJSON file written by the
+    export_hunts command, in batches.
+    """
+
+    help = "Import hunts and their clues from NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input",
+            nargs="?",
+            default="-",
+            help="File the hunts are read from, the standard input by default",
+        )
+        parser.add_argument(
+            "--creator",
+            help="Username of the user made the creator of every imported hunt",
+        )
+        parser.add_argument(
+            "--new-ids",
+            action="store_true",
+            help="Give new ids to the hunts and clues, to import copies of them",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=TRANSFER_BATCH_SIZE,
+            help="Number of hunts created in each transaction",
+        )
+
+    def handle(self, *args, **options):
+        creator = None
+        if options["creator"]:
+            try:
+                creator = User.objects.get(username=options["creator"])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user: {options['creator']}")
+
+        if options["input"] == "-":
+            lines = sys.stdin
+        else:
+            lines = open(options["input"], encoding="utf-8")
+        try:
+            with lines:
+                totals = import_hunts(
+                    lines, creator, options["new_ids"], options["batch_size"]
+                )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"{totals['hunts']} hunts, {totals['clues']} clues and "
+            f"{totals['progress']} progress imported"
+        )
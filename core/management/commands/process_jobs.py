@@ -0,0 +1,46 @@
+"""
+Management command to run the background jobs of the core app.
+"""
+
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import run_pending_jobs, run_workers
+
+
+class Command(BaseCommand):
+    """
+    Run the jobs queued in core.jobs with a pool of worker threads.
+    """
+
+    help = "Process the queued image jobs until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.JOB_WORKER_CONCURRENCY,
+            help="Number of worker threads",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the runnable jobs and exit instead of waiting for new ones",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            count = run_pending_jobs()
+        else:
+            stop = threading.Event()
+            # Let the running jobs finish on Ctrl+C or when the container stops
+            signal.signal(signal.SIGINT, lambda *args: stop.set())
+            signal.signal(signal.SIGTERM, lambda *args: stop.set())
+            self.stdout.write(
+                f"Processing jobs with {options['concurrency']} worker threads"
+            )
+            count = run_workers(options["concurrency"], stop)
+        self.stdout.write(f"{count} jobs processed")
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_treasurehunt_completion_message'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='treasurehunt',
+            index=models.Index(fields=['created_at', 'id'], name='hunt_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasurehunt',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('title', 'description', config='english'), name='hunt_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasurehunt',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='hunt_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
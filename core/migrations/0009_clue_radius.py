@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_treasurehunt_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clue',
+            name='radius',
+            field=models.PositiveIntegerField(default=15, help_text='Distance in meters from the location within which the clue is solved'),
+        ),
+    ]
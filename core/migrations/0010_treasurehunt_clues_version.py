@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_clue_radius'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treasurehunt',
+            name='clues_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Incremented whenever a clue of the hunt is saved or deleted'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+from core.geo import geohash_encode
+
+
+def populate_start_location(apps, schema_editor):
+    TreasureHunt = apps.get_model("core", "TreasureHunt")
+    Clue = apps.get_model("core", "Clue")
+    for hunt in TreasureHunt.objects.all().iterator():
+        first_clue = (
+            Clue.objects.filter(treasure_hunt=hunt)
+            .order_by("order")
+            .values("latitude", "longitude")
+            .first()
+        )
+        if first_clue:
+            TreasureHunt.objects.filter(pk=hunt.pk).update(
+                start_latitude=first_clue["latitude"],
+                start_longitude=first_clue["longitude"],
+                start_geohash=geohash_encode(
+                    first_clue["latitude"], first_clue["longitude"]
+                ),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_treasurehunt_clues_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treasurehunt',
+            name='start_geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Geohash of the location of the first clue, used to find nearby hunts', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='treasurehunt',
+            name='start_latitude',
+            field=models.FloatField(blank=True, editable=False, help_text='Latitude of the first clue of the hunt', null=True),
+        ),
+        migrations.AddField(
+            model_name='treasurehunt',
+            name='start_longitude',
+            field=models.FloatField(blank=True, editable=False, help_text='Longitude of the first clue of the hunt', null=True),
+        ),
+        migrations.RunPython(populate_start_location, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+CREATE_TRIGGER = """
+CREATE OR REPLACE FUNCTION core_notify_hunt_progress() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('hunt_progress', OLD.treasure_hunt_id::text);
+    ELSE
+        PERFORM pg_notify('hunt_progress', NEW.treasure_hunt_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_userprogress_notify
+AFTER INSERT OR UPDATE OR DELETE ON core_userprogress
+FOR EACH ROW EXECUTE FUNCTION core_notify_hunt_progress();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS core_userprogress_notify ON core_userprogress;
+DROP FUNCTION IF EXISTS core_notify_hunt_progress();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0011_treasurehunt_start_location"),
+    ]
+
+    operations = [migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER)]
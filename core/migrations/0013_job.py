@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:41
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_userprogress_notify_trigger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('hunt_image', 'Hunt image'), ('clue_image', 'Clue image'), ('clue_embedding', 'Clue image embedding')], max_length=20)),
+                ('source', models.CharField(blank=True, help_text='Storage name of the uploaded file to process', max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='The job is not run before this date')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('clue', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='core.clue')),
+                ('treasure_hunt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='core.treasurehunt')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clue',
+            name='reference_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Storage names and sizes of the responsive variants of the image'),
+        ),
+        migrations.AddField(
+            model_name='treasurehunt',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Storage names and sizes of the responsive variants of the image'),
+        ),
+    ]
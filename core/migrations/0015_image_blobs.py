@@ -0,0 +1,58 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:53
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def create_blobs(apps, schema_editor):
+    # Images stored before deduplication get a blob of their own, without digest
+    ImageBlob = apps.get_model("core", "ImageBlob")
+    TreasureHunt = apps.get_model("core", "TreasureHunt")
+    Clue = apps.get_model("core", "Clue")
+    for model, field_name in [
+        (TreasureHunt, "image"),
+        (Clue, "reference_image"),
+    ]:
+        instances = model.objects.exclude(**{f"{field_name}__isnull": True}).exclude(
+            **{field_name: ""}
+        )
+        for instance in instances.iterator():
+            blob = ImageBlob.objects.create(
+                image=getattr(instance, field_name).name,
+                variants=getattr(instance, f"{field_name}_variants"),
+            )
+            model.objects.filter(pk=instance.pk).update(**{f"{field_name}_blob": blob})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('digest', models.CharField(blank=True, help_text='SHA-256 of the optimized image, empty for images stored before deduplication', max_length=64, null=True, unique=True)),
+                ('source_digest', models.CharField(blank=True, db_index=True, help_text='SHA-256 of the uploaded file the image was optimized from', max_length=64)),
+                ('image', models.CharField(help_text='Storage name of the optimized image', max_length=255)),
+                ('variants', models.JSONField(blank=True, default=dict, help_text='Storage names and sizes of the responsive variants of the image')),
+                ('references', models.PositiveIntegerField(default=1, help_text='Number of hunts and clues using the image')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='clue',
+            name='reference_image_blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.imageblob'),
+        ),
+        migrations.AddField(
+            model_name='treasurehunt',
+            name='image_blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.imageblob'),
+        ),
+        migrations.RunPython(create_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:58
+
+import pgvector.django.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking the writes to the clues
+    atomic = False
+
+    dependencies = [
+        ('core', '0015_image_blobs'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='clue',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['image_embedding'], m=16, name='clue_image_embedding_hnsw_idx', opclasses=['vector_cosine_ops']),
+        ),
+    ]
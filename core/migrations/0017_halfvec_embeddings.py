@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:00
+
+import pgvector.django.halfvec
+import pgvector.django.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def copy_embeddings_to_blobs(apps, schema_editor):
+    ImageBlob = apps.get_model("core", "ImageBlob")
+    Clue = apps.get_model("core", "Clue")
+    ImageBlob.objects.filter(embedding__isnull=True).update(
+        embedding=Subquery(
+            Clue.objects.filter(
+                reference_image_blob=OuterRef("pk"), image_embedding__isnull=False
+            ).values("image_embedding")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking the writes to the clues
+    atomic = False
+
+    dependencies = [
+        ('core', '0016_clue_image_embedding_hnsw'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='clue',
+            name='clue_image_embedding_hnsw_idx',
+        ),
+        migrations.AddField(
+            model_name='imageblob',
+            name='embedding',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=512, help_text='LLM embedding of the image, copied to the clues using it', null=True),
+        ),
+        migrations.AlterField(
+            model_name='clue',
+            name='image_embedding',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=512, help_text='LLM embedding of the reference image', null=True),
+        ),
+        migrations.RunPython(copy_embeddings_to_blobs, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='clue',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['image_embedding'], m=16, name='clue_image_embedding_hnsw_idx', opclasses=['halfvec_cosine_ops']),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:01
+
+import pgvector.django.halfvec
+import pgvector.django.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking the writes to the hunts
+    atomic = False
+
+    dependencies = [
+        ('core', '0017_halfvec_embeddings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treasurehunt',
+            name='centroid',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=512, editable=False, help_text='Mean of the embeddings of the clue images, used to find similar hunts', null=True),
+        ),
+        migrations.RunSQL(
+            "UPDATE core_treasurehunt SET centroid = ("
+            "SELECT avg(image_embedding) FROM core_clue "
+            "WHERE core_clue.treasure_hunt_id = core_treasurehunt.id)",
+            migrations.RunSQL.noop,
+        ),
+        AddIndexConcurrently(
+            model_name='treasurehunt',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['centroid'], m=16, name='hunt_centroid_hnsw_idx', opclasses=['halfvec_cosine_ops']),
+        ),
+    ]
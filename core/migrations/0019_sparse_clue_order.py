@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:09
+
+import django.db.models.constraints
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_treasurehunt_centroid'),
+    ]
+
+    operations = [
+        # Spread the orders of the clues apart, keeping their sequence, which
+        # also removes the duplicate orders
+        migrations.RunSQL(
+            'UPDATE core_clue SET "order" = ranked.position * 1024 FROM ('
+            'SELECT id, row_number() OVER ('
+            'PARTITION BY treasure_hunt_id ORDER BY "order", created_at'
+            ') AS position FROM core_clue'
+            ') AS ranked WHERE core_clue.id = ranked.id',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='clue',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('treasure_hunt', 'order'), name='clue_hunt_order_unique'),
+        ),
+    ]
@@ -6,13 +6,38 @@ including their attributes and relationships with other models.
 
 import uuid
 import os
+from collections import Counter
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    Avg,
+    Case,
+    Count,
+    Deferrable,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchVector
 from django.contrib.auth.models import User, Permission
-from django.db.models.signals import post_save
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from pgvector.django import VectorField
+from pgvector.django import CosineDistance, HalfVectorField, HnswIndex
+
+from .cache import bump_catalog_version, bump_progress_version
+from .geo import GEOHASH_PRECISION, geohash_cells, geohash_encode
+from .ordering import CLUE_ORDER_GAP, order_between
+from .storage import delete_files
+from .utils import VARIANT_FORMATS
 
 
 @receiver(post_save, sender=User)
@@ -60,6 +85,269 @@ def hunt_image_path(instance, filename):
     return f"hunt_images/{instance.id}/{generator_id}{ext}"
 
 
+def image_file_names(image, variants):
+    """
+    This function lists the storage names of an image and of its responsive variants.
+
+    Parameters:
+    image (str): The storage name of the image.
+    variants (dict): The variants of the image, as stored by core.blobs.
+
+    Returns:
+    list: The storage names of the files.
+    """
+    names = [image] if image else []
+    for variant in variants.values():
+        for image_format in VARIANT_FORMATS:
+            name = variant.get(image_format)
+            # Variants of the same size share their files
+            if name and name not in names:
+                names.append(name)
+    return names
+
+
+class ImageBlob(models.Model):
+    """
+    This model represents an optimized image and its responsive variants, stored
+    once however many hunts and clues use it (see core.blobs).
+
+    Blobs are looked up by the SHA-256 digest of the optimized image, and by the
+    digest of the uploaded file it was optimized from, so that uploading a known
+    image again neither processes, stores nor embeds it twice. The files are deleted
+    when the last hunt or clue using them releases the blob.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    digest = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="SHA-256 of the optimized image, empty for images stored "
+        "before deduplication",
+    )
+    source_digest = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="SHA-256 of the uploaded file the image was optimized from",
+    )
+    image = models.CharField(
+        max_length=255, help_text="Storage name of the optimized image"
+    )
+    variants = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Storage names and sizes of the responsive variants of the image",
+    )
+    references = models.PositiveIntegerField(
+        default=1, help_text="Number of hunts and clues using the image"
+    )
+    embedding = HalfVectorField(
+        dimensions=512,
+        null=True,
+        blank=True,
+        help_text="LLM embedding of the image, copied to the clues using it",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.image
+
+    @classmethod
+    def release(cls, blob_ids):
+        """
+        Drop one reference to each blob, and delete the blobs that are no longer
+        used together with their files.
+
+        The files are deleted while the blob rows are locked, so that a
+        concurrent upload of the same image waits for the deletion and then
+        stores the image again instead of reusing deleted files.
+
+        Parameters:
+        blob_ids (iterable): Ids of the released blobs, once per reference; None
+        values are ignored.
+        """
+        counts = Counter(blob_id for blob_id in blob_ids if blob_id)
+        if not counts:
+            return
+        with transaction.atomic():
+            unused = []
+            for blob in cls.objects.select_for_update().filter(pk__in=counts):
+                blob.references = max(blob.references - counts[blob.pk], 0)
+                if blob.references:
+                    blob.save(update_fields=["references"])
+                else:
+                    unused.append(blob)
+            if unused:
+                names = []
+                for blob in unused:
+                    names += image_file_names(blob.image, blob.variants)
+                delete_files(names)
+                cls.objects.filter(pk__in=[blob.pk for blob in unused]).delete()
+
+
+def clues_before(treasure_hunt, order):
+    """
+    Return an expression counting the clues of a hunt placed before an order.
+
+    Clue orders are sparse (see core.ordering), so the number of a clue in its
+    hunt is one more than this count.
+
+    Parameters:
+    treasure_hunt: The hunt, or an OuterRef to it.
+    order: The order, or an OuterRef to it.
+
+    Returns:
+    Coalesce: The count, 0 if there is no clue before the order.
+    """
+    clues = (
+        Clue.objects.filter(treasure_hunt=treasure_hunt, order__lt=order)
+        .order_by()
+        .values("treasure_hunt")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(clues), Value(0))
+
+
+class TreasureHuntQuerySet(models.QuerySet):
+    """
+    QuerySet for treasure hunts with helpers used by the catalog views.
+    """
+
+    def visible_to(self, user):
+        """
+        Restrict the queryset to public hunts and the private hunts created by the user.
+        """
+        return self.filter(Q(is_public=True) | Q(creator=user))
+
+    def near(self, lat, lng, radius_m):
+        """
+        Filter hunts whose first clue may lie within a radius of a location.
+
+        The filter is a prefix lookup on the indexed start_geohash column over
+        the geohash cells covering the circle, so it only returns candidates;
+        the exact distance must still be checked by the caller.
+        """
+        queryset = self.exclude(start_geohash="")
+        prefixes = geohash_cells(lat, lng, radius_m)
+        if prefixes is None:
+            return queryset
+        condition = Q()
+        for prefix in prefixes:
+            condition |= Q(start_geohash__startswith=prefix)
+        return queryset.filter(condition)
+
+    def search(self, query):
+        """
+        Filter hunts whose title or description match the query.
+
+        Full-text search over title and description catches whole words and
+        their stems, while trigram similarity on the title tolerates typos and
+        partial words. Both conditions are backed by GIN indexes.
+        """
+        return self.alias(
+            search_vector=SearchVector("title", "description", config="english")
+        ).filter(
+            Q(search_vector=SearchQuery(query, config="english"))
+            | Q(title__trigram_similar=query)
+        )
+
+    def refresh_centroids(self):
+        """
+        Recompute the centroid of each hunt, the mean of the embeddings of its
+        clue images.
+
+        Costs a single UPDATE whose subquery only reads the clues of the hunts,
+        so it is run for the hunts whose clue embeddings changed rather than for
+        the whole catalog.
+        """
+        centroids = (
+            Clue.objects.filter(treasure_hunt=OuterRef("pk"))
+            .values("treasure_hunt")
+            .annotate(
+                centroid=Avg(
+                    "image_embedding", output_field=HalfVectorField(dimensions=512)
+                )
+            )
+            .values("centroid")
+        )
+        return self.update(centroid=Subquery(centroids))
+
+    def similar_to(self, hunt):
+        """
+        Order the playable public hunts by the similarity of their centroid with
+        the centroid of a hunt, excluding the hunt itself.
+
+        The ordering is an approximate nearest neighbor search over the HNSW
+        index on the centroids, so the queryset should be sliced.
+        """
+        return (
+            self.filter(is_public=True, is_active=True, centroid__isnull=False)
+            .filter(Q(end_date__isnull=True) | Q(end_date__gt=timezone.now()))
+            .exclude(pk=hunt.pk)
+            .annotate(distance=CosineDistance("centroid", hunt.centroid))
+            .order_by("distance")
+        )
+
+    def with_progress(self, user):
+        """
+        Annotate each hunt with its clue count, the user's progress and its expiry flag.
+
+        Every value the catalog needs is computed by the database, so evaluating
+        the resulting queryset costs a single query regardless of the number of
+        hunts. The following attributes are added to each hunt:
+
+        - total_clues: number of clues in the hunt
+        - is_completed: whether the user has completed the hunt
+        - total_points: points earned by the user in the hunt
+        - current_clue_order: order of the user's current clue (0 if not enrolled)
+        - solved_clues: number of clues before the user's current clue
+        - is_expired: whether the end date of the hunt has passed
+        - progress_percentage: percentage of clues solved by the user
+        """
+        progress = UserProgress.objects.filter(user=user, treasure_hunt=OuterRef("pk"))
+        return (
+            self.select_related("creator")
+            .annotate(
+                total_clues=Count("clues"),
+                is_completed=Coalesce(
+                    Subquery(progress.values("is_completed")[:1]), Value(False)
+                ),
+                total_points=Coalesce(
+                    Subquery(progress.values("total_points")[:1]), Value(0)
+                ),
+                current_clue_order=Coalesce(
+                    Subquery(progress.values("current_clue__order")[:1]), Value(0)
+                ),
+                is_expired=Case(
+                    When(end_date__lt=timezone.now(), then=Value(True)),
+                    default=Value(False),
+                ),
+            )
+            .annotate(
+                # Orders are sparse, so the clues before the current one are counted
+                solved_clues=clues_before(
+                    OuterRef("pk"), OuterRef("current_clue_order")
+                ),
+            )
+            .annotate(
+                progress_percentage=Case(
+                    When(is_completed=True, then=Value(100.0)),
+                    When(
+                        total_clues__gt=0,
+                        then=Cast(F("solved_clues"), FloatField())
+                        * 100.0
+                        / F("total_clues"),
+                    ),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                )
+            )
+        )
+
+
 class TreasureHunt(models.Model):
     """
     This model represents a treasure hunt.
@@ -74,6 +362,20 @@ class TreasureHunt(models.Model):
         blank=True,
         help_text="Main image of the treasure hunt",
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Storage names and sizes of the responsive variants of the image",
+    )
+    image_blob = models.ForeignKey(
+        ImageBlob,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+        on_delete=models.SET_NULL,
+    )
     creator = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     end_date = models.DateTimeField(
@@ -93,20 +395,137 @@ class TreasureHunt(models.Model):
         default="Congratulations! You have completed the treasure hunt.",
         help_text="Message displayed when the user completes the hunt",
     )
+    clues_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Incremented whenever a clue of the hunt is saved or deleted",
+    )
+    start_latitude = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Latitude of the first clue of the hunt",
+    )
+    start_longitude = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Longitude of the first clue of the hunt",
+    )
+    start_geohash = models.CharField(
+        max_length=GEOHASH_PRECISION,
+        blank=True,
+        default="",
+        editable=False,
+        db_index=True,
+        help_text="Geohash of the location of the first clue, used to find nearby hunts",
+    )
+    centroid = HalfVectorField(
+        dimensions=512,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Mean of the embeddings of the clue images, used to find similar hunts",
+    )
+
+    objects = TreasureHuntQuerySet.as_manager()
 
     class Meta:
         permissions = [
             ("can_create_hunts", "Can create treasure hunts"),
         ]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="hunt_created_at_id_idx"),
+            GinIndex(
+                SearchVector("title", "description", config="english"),
+                name="hunt_search_vector_idx",
+            ),
+            GinIndex(
+                fields=["title"],
+                name="hunt_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            # Approximate nearest neighbor search of similar hunts
+            HnswIndex(
+                name="hunt_centroid_hnsw_idx",
+                fields=["centroid"],
+                m=16,
+                ef_construction=64,
+                opclasses=["halfvec_cosine_ops"],
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def refresh_start_location(self):
+        """
+        Copy the location of the first clue of the hunt to its start fields.
+        """
+        first_clue = (
+            self.clues.order_by("order").values("latitude", "longitude").first()
+        )
+        if first_clue:
+            self.start_latitude = first_clue["latitude"]
+            self.start_longitude = first_clue["longitude"]
+            self.start_geohash = geohash_encode(
+                first_clue["latitude"], first_clue["longitude"]
+            )
+        else:
+            self.start_latitude = self.start_longitude = None
+            self.start_geohash = ""
+        TreasureHunt.objects.filter(pk=self.pk).update(
+            start_latitude=self.start_latitude,
+            start_longitude=self.start_longitude,
+            start_geohash=self.start_geohash,
+        )
+
+    def rebalance_clues(self):
+        """
+        Spread the orders of the clues of the hunt CLUE_ORDER_GAP apart again,
+        keeping their sequence, without sending the post_save signals.
+        """
+        clues = list(self.clues.order_by("order").only("id", "order"))
+        for position, clue in enumerate(clues, start=1):
+            clue.order = position * CLUE_ORDER_GAP
+        Clue.objects.bulk_update(clues, ["order"])
+
+    def set_image(self, blob):
+        """
+        Make a stored image the image of the hunt, without saving the hunt.
+
+        Parameters:
+        blob (ImageBlob): The image, with a reference taken for the hunt.
+
+        Returns:
+        list: The ids of the blobs to release, see clear_image.
+        """
+        released = self.clear_image()
+        self.image = blob.image
+        self.image_variants = blob.variants
+        self.image_blob = blob
+        return released
+
+    def clear_image(self):
+        """
+        Remove the image of the hunt and its variants, without saving the hunt
+        nor releasing the image.
+
+        Returns:
+        list: The ids of the blobs to release once the hunt is saved.
+        """
+        released = [self.image_blob_id] if self.image_blob_id else []
+        self.image = None
+        self.image_variants = {}
+        self.image_blob = None
+        return released
+
     def delete(self, *args, **kwargs):
-        # Delete the image from S3 if it exists
-        if self.image:
-            self.image.delete(save=False)
+        # Release the images of the hunt and of its clues together
+        released = [self.image_blob_id]
+        released += self.clues.values_list("reference_image_blob", flat=True)
         super().delete(*args, **kwargs)
+        ImageBlob.release(released)
 
 
 class Clue(models.Model):
@@ -118,6 +537,7 @@ class Clue(models.Model):
     treasure_hunt = models.ForeignKey(
         TreasureHunt, related_name="clues", on_delete=models.CASCADE
     )
+    # Sparse sort key of the clue within its hunt, see core.ordering
     order = models.IntegerField()
     hint_text = models.TextField()
     unlock_message = models.TextField(
@@ -126,6 +546,10 @@ class Clue(models.Model):
     )
     latitude = models.FloatField()
     longitude = models.FloatField()
+    radius = models.PositiveIntegerField(
+        default=15,
+        help_text="Distance in meters from the location within which the clue is solved",
+    )
     reference_image = models.ImageField(
         upload_to=clue_image_path,
         max_length=255,
@@ -133,7 +557,23 @@ class Clue(models.Model):
         blank=True,
         help_text="Image related to the clue.",
     )
-    image_embedding = VectorField(
+    reference_image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Storage names and sizes of the responsive variants of the image",
+    )
+    reference_image_blob = models.ForeignKey(
+        ImageBlob,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+        on_delete=models.SET_NULL,
+    )
+    # Half precision halves the size of the rows read by every play request,
+    # for a recall of the nearest neighbor searches that is almost unchanged
+    image_embedding = HalfVectorField(
         dimensions=512,
         null=True,
         blank=True,
@@ -143,15 +583,111 @@ class Clue(models.Model):
 
     class Meta:
         ordering = ["order"]
+        constraints = [
+            # Deferred so that the clues of a hunt can swap orders in a transaction
+            models.UniqueConstraint(
+                fields=["treasure_hunt", "order"],
+                name="clue_hunt_order_unique",
+                deferrable=Deferrable.DEFERRED,
+            ),
+        ]
+        indexes = [
+            # Approximate nearest neighbor search of the photos (see core.photo_match)
+            HnswIndex(
+                name="clue_image_embedding_hnsw_idx",
+                fields=["image_embedding"],
+                m=16,
+                ef_construction=64,
+                opclasses=["halfvec_cosine_ops"],
+            ),
+        ]
 
     def __str__(self):
         return f"Clue {self.order} - {self.treasure_hunt.title}"
 
+    def move_after(self, previous=None):
+        """
+        Move the clue right after another clue of its hunt.
+
+        Only the order of the clue is written, halfway between its new
+        neighbors, unless they have no room left between them, in which case
+        the clues of the hunt are rebalanced first.
+
+        Parameters:
+        previous (Clue): The clue to move it after, None to move it first.
+
+        Returns:
+        bool: Whether the clue was moved, False if it was already there.
+        """
+        with transaction.atomic():
+            # Serialize the moves of the clues of the hunt
+            TreasureHunt.objects.select_for_update().only("pk").get(
+                pk=self.treasure_hunt_id
+            )
+            while True:
+                orders = dict(
+                    Clue.objects.filter(
+                        treasure_hunt_id=self.treasure_hunt_id
+                    ).values_list("pk", "order")
+                )
+                lower = orders[previous.pk] if previous else 0
+                upper = min(
+                    (
+                        order
+                        for pk, order in orders.items()
+                        if order > lower and pk != self.pk
+                    ),
+                    default=None,
+                )
+                self.order = orders[self.pk]
+                if lower < self.order and (upper is None or self.order < upper):
+                    return False
+                order = order_between(lower, upper)
+                if order is not None:
+                    break
+                TreasureHunt(pk=self.treasure_hunt_id).rebalance_clues()
+
+            self.order = order
+            self.save(update_fields=["order"])
+        return True
+
+    def set_reference_image(self, blob):
+        """
+        Make a stored image the reference image of the clue, without saving the clue.
+
+        Parameters:
+        blob (ImageBlob): The image, with a reference taken for the clue.
+
+        Returns:
+        list: The ids of the blobs to release, see clear_reference_image.
+        """
+        released = self.clear_reference_image()
+        self.reference_image = blob.image
+        self.reference_image_variants = blob.variants
+        self.reference_image_blob = blob
+        return released
+
+    def clear_reference_image(self):
+        """
+        Remove the reference image of the clue and its variants, without saving
+        the clue nor releasing the image.
+
+        Returns:
+        list: The ids of the blobs to release once the clue is saved.
+        """
+        released = (
+            [self.reference_image_blob_id] if self.reference_image_blob_id else []
+        )
+        self.reference_image = None
+        self.reference_image_variants = {}
+        self.reference_image_blob = None
+        return released
+
     def delete(self, *args, **kwargs):
-        # Delete the image from S3 if it exists
-        if self.reference_image:
-            self.reference_image.delete(save=False)
+        # Release the image, which is deleted if no other clue or hunt uses it
+        released = self.clear_reference_image()
         super().delete(*args, **kwargs)
+        ImageBlob.release(released)
 
 
 class UserProgress(models.Model):
@@ -177,3 +713,179 @@ class UserProgress(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.treasure_hunt.title}"
+
+    def advance_from(self, clue_id, next_clue_id, solved=1):
+        """
+        Atomically move the progress past one or more solved clues.
+
+        The progress is only updated if its current clue is still the first
+        solved clue, and points are incremented by the database, so concurrent
+        requests for the same clue can neither award points twice nor skip a
+        clue. The whole change is a single UPDATE statement.
+
+        Parameters:
+        clue_id (UUID): Id of the first clue the user has just solved (the current clue).
+        next_clue_id (UUID): Id of the clue that follows the solved ones, or None
+        if the last clue of the hunt was solved.
+        solved (int): Number of consecutive clues solved.
+
+        Returns:
+        bool: True if this call advanced the progress, False if another request
+        already did.
+        """
+        hunt = self.treasure_hunt
+        points = hunt.points_per_clue * solved
+        updates = {}
+        if next_clue_id:
+            updates["current_clue_id"] = next_clue_id
+        else:
+            # This was the last clue - mark as completed
+            points += hunt.completion_points
+            updates["is_completed"] = True
+            updates["completed_at"] = timezone.now()
+        updates["total_points"] = F("total_points") + points
+
+        updated = UserProgress.objects.filter(
+            pk=self.pk, current_clue_id=clue_id, is_completed=False
+        ).update(**updates)
+
+        # update() bypasses the post_save signal, so invalidate the cache here
+        if updated:
+            bump_progress_version(self.user_id)
+        return bool(updated)
+
+
+class CacheVersion(models.Model):
+    """
+    This model holds the version keys of core.cache when the hunt cache is local
+    to each process, so that a bump made by any process, including the job
+    workers and the management commands, is seen by all of them.
+    """
+
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.key} = {self.version}"
+
+
+class Job(models.Model):
+    """
+    This model represents a background job processing an image of a hunt or a clue.
+    Jobs are queued by the views and run by the process_jobs management command
+    (see core.jobs).
+    """
+
+    HUNT_IMAGE = "hunt_image"
+    CLUE_IMAGE = "clue_image"
+    CLUE_EMBEDDING = "clue_embedding"
+    KIND_CHOICES = [
+        (HUNT_IMAGE, "Hunt image"),
+        (CLUE_IMAGE, "Clue image"),
+        (CLUE_EMBEDDING, "Clue image embedding"),
+    ]
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    treasure_hunt = models.ForeignKey(
+        TreasureHunt, related_name="jobs", on_delete=models.CASCADE
+    )
+    clue = models.ForeignKey(
+        Clue, related_name="jobs", null=True, blank=True, on_delete=models.CASCADE
+    )
+    source = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Storage name of the uploaded file to process",
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(
+        default=timezone.now, help_text="The job is not run before this date"
+    )
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "run_after"], name="job_status_run_after_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.treasure_hunt.title} ({self.status})"
+
+
+@receiver([post_save, post_delete], sender=TreasureHunt)
+@receiver([post_save, post_delete], sender=Clue)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Signal handler to invalidate the cached catalog when a hunt or a clue changes.
+    """
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=UserProgress)
+def invalidate_progress_cache(sender, instance, **kwargs):
+    """
+    Signal handler to invalidate the cached progress of a user when it changes.
+    """
+    bump_progress_version(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Clue)
+def bump_clues_version(sender, instance, **kwargs):
+    """
+    Signal handler to mark the cached clue chains of a hunt as outdated when a clue changes.
+    """
+    TreasureHunt.objects.filter(pk=instance.treasure_hunt_id).update(
+        clues_version=F("clues_version") + 1
+    )
+
+
+@receiver([post_save, post_delete], sender=Clue)
+def update_start_location(sender, instance, **kwargs):
+    """
+    Signal handler to keep the start location of a hunt in sync with its first clue.
+    """
+    hunt = TreasureHunt(pk=instance.treasure_hunt_id)
+    hunt.refresh_start_location()
+
+
+@receiver([post_save, post_delete], sender=Clue)
+def update_hunt_centroid(sender, instance, update_fields=None, **kwargs):
+    """
+    Signal handler to keep the centroid of a hunt in sync with the embeddings of its clues.
+    """
+    if update_fields is not None and "image_embedding" not in update_fields:
+        return
+    # New clues and deleted clues without embedding leave the centroid unchanged
+    if instance.image_embedding is None and (
+        kwargs.get("created") or kwargs["signal"] is post_delete
+    ):
+        return
+    TreasureHunt.objects.filter(pk=instance.treasure_hunt_id).refresh_centroids()
+
+
+@receiver(post_delete, sender=Job)
+def delete_job_source(sender, instance, **kwargs):
+    """
+    Signal handler to delete the uploaded file of a job that will never be processed.
+    """
+    if instance.source and instance.status != Job.DONE:
+        default_storage.delete(instance.source)
@@ -0,0 +1,101 @@
+"""
+Sparse ordering of the clues of a hunt.
+
+Clue.order is a sort key, not the number of the clue: consecutive clues are
+created CLUE_ORDER_GAP apart, so that a clue can be moved or inserted between
+two others by only writing its own order, halfway between theirs. When two
+neighbors run out of room, the clues of the hunt are spread apart again (see
+TreasureHunt.rebalance_clues). The number shown to players is the position of
+the clue in its hunt: the views read it from the clue chain of the hunt (see
+core.chains), and querysets annotate it with clues_before.
+"""
+
+import bisect
+
+# Distance between the orders of consecutive clues after a rebalance
+CLUE_ORDER_GAP = 1024
+
+
+def order_between(lower, upper=None):
+    """
+    Return an order strictly between two others.
+
+    Args:
+        lower: Order of the previous clue, 0 for the first position
+        upper: Order of the next clue, None for the last position
+
+    Returns:
+        int: The order, or None if there is no room left between them
+    """
+    if upper is None:
+        return lower + CLUE_ORDER_GAP
+    if upper - lower < 2:
+        return None
+    return (lower + upper) // 2
+
+
+def _increasing_indexes(orders):
+    # Indexes of a longest strictly increasing subsequence of the known orders
+    tails, tail_indexes = [], []
+    previous = [None] * len(orders)
+    for index, order in enumerate(orders):
+        if order is None or order <= 0:
+            continue
+        position = bisect.bisect_left(tails, order)
+        previous[index] = tail_indexes[position - 1] if position else None
+        if position == len(tails):
+            tails.append(order)
+            tail_indexes.append(index)
+        else:
+            tails[position] = order
+            tail_indexes[position] = index
+
+    indexes = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        indexes.append(index)
+        index = previous[index]
+    return set(indexes)
+
+
+def sparse_orders(orders):
+    """
+    Return the orders giving a sequence of clues, changing as few as possible.
+
+    The longest run of clues already in sequence keeps its orders, and the
+    other clues get orders spread between their kept neighbors. All the clues
+    are spread CLUE_ORDER_GAP apart again if there is no room left.
+
+    Args:
+        orders: The current order of each clue of the sequence, None for the
+            new clues
+
+    Returns:
+        list: The order of each clue, increasing
+    """
+    kept = _increasing_indexes(orders)
+    result = list(orders)
+    lower = 0
+    index = 0
+    while index < len(orders):
+        if index in kept:
+            lower = orders[index]
+            index += 1
+            continue
+        end = index
+        while end < len(orders) and end not in kept:
+            end += 1
+        count = end - index
+        if end == len(orders):
+            result[index:end] = [
+                lower + CLUE_ORDER_GAP * (offset + 1) for offset in range(count)
+            ]
+        elif orders[end] - lower > count:
+            result[index:end] = [
+                lower + (orders[end] - lower) * (offset + 1) // (count + 1)
+                for offset in range(count)
+            ]
+        else:
+            return [CLUE_ORDER_GAP * (offset + 1) for offset in range(len(orders))]
+        index = end
+    return result
@@ -0,0 +1,82 @@
+"""
+Keyset pagination helpers for the core app.
+
+Pages are ordered by (created_at, id) and the position in the listing is
+carried by an opaque cursor, so fetching any page costs the same single
+indexed query no matter how deep the client has scrolled.
+"""
+
+import base64
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+def encode_cursor(hunt):
+    """
+    Encode the position of a hunt in the listing as an opaque cursor.
+
+    Args:
+        hunt: The last TreasureHunt of the current page
+
+    Returns:
+        str: URL-safe cursor pointing right after the given hunt
+    """
+    raw = f"{hunt.created_at.isoformat()}|{hunt.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor generated by encode_cursor.
+
+    Args:
+        cursor: The cursor received from the client
+
+    Returns:
+        tuple: (created_at, id) of the last hunt of the previous page
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, hunt_id = raw.split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(hunt_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def paginate_hunts(queryset, cursor=None, page_size=None):
+    """
+    Return one page of hunts using keyset pagination on (created_at, id).
+
+    Args:
+        queryset: TreasureHunt queryset to paginate
+        cursor: Cursor returned with the previous page, or None for the first page
+        page_size: Number of hunts per page (default HUNT_CATALOG_PAGE_SIZE)
+
+    Returns:
+        tuple: (list of hunts, cursor of the next page or None)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    page_size = page_size or settings.HUNT_CATALOG_PAGE_SIZE
+    queryset = queryset.order_by("created_at", "id")
+
+    if cursor:
+        created_at, hunt_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=hunt_id)
+        )
+
+    # Fetch one extra row to know whether there is a next page
+    hunts = list(queryset[: page_size + 1])
+    if len(hunts) > page_size:
+        hunts = hunts[:page_size]
+        return hunts, encode_cursor(hunts[-1])
+    return hunts, None
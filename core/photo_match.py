@@ -0,0 +1,101 @@
+"""
+Verification of clues with photos.
+
+Instead of checking their location, players can solve a clue by taking a
+photo of the place shown by its reference image. The CLIP embedding of the
+photo is compared with the embedding of the reference image of the current
+clue, and the clue is solved when their cosine similarity reaches
+PHOTO_MATCH_THRESHOLD. Both embeddings are normalized, so their cosine
+similarity is their dot product.
+
+When the photo does not match the current clue, the other clues of the hunt
+are searched for the closest reference image with the HNSW index on
+Clue.image_embedding, so that players who photograph a place they have already
+found can be told so.
+
+Embeddings are stored in half precision (pgvector halfvec). The embeddings of
+the photos are cached by content hash, so sending the same photo again, e.g.
+after being throttled, does not run the model again.
+
+Unlike the clue images, which are embedded by the embedding worker, photos
+are embedded in the web process handling the request, since the player waits
+for the answer. Each web process then loads the model on its first photo,
+which takes hundreds of MB and a few seconds, so photo verification is only
+enabled by PHOTO_VERIFICATION_ENABLED.
+"""
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from pgvector.django import CosineDistance
+from pgvector.utils import HalfVector
+
+from .blobs import file_digest
+from .cache import get_cache
+from .models import Clue
+from .utils import generate_image_embedding
+
+
+def photo_embedding(photo):
+    """
+    Return the normalized embedding of a photo taken by a player.
+    """
+    key = f"photo_embedding:{file_digest(photo)}"
+    cache = get_cache()
+    embedding = cache.get(key)
+    if embedding is None:
+        embedding = generate_image_embedding(photo, as_list=False)
+        cache.set(key, embedding, timeout=settings.HUNT_CACHE_TIMEOUT)
+    return embedding
+
+
+def similarity(embedding, other):
+    """
+    Return the cosine similarity of two normalized embeddings.
+    """
+    if isinstance(other, HalfVector):
+        other = other.to_numpy()
+    return float(np.dot(embedding, other.astype(np.float32)))
+
+
+def is_match(value):
+    """
+    Check whether a similarity is high enough for a photo to solve a clue.
+    """
+    return value >= settings.PHOTO_MATCH_THRESHOLD
+
+
+def closest_clues(embedding, hunt_id=None, limit=1):
+    """
+    Return the clues whose reference images are the closest to an embedding.
+
+    The search is an approximate nearest neighbor search over the HNSW index,
+    examining PHOTO_MATCH_EF_SEARCH candidates.
+
+    Args:
+        embedding: A normalized embedding
+        hunt_id: Id of the hunt to search the clues of, all the hunts if None
+        limit: Maximum number of clues returned
+
+    Returns:
+        list: The clues, the closest first, each with its "similarity"
+    """
+    clues = Clue.objects.filter(image_embedding__isnull=False)
+    if hunt_id:
+        clues = clues.filter(treasure_hunt_id=hunt_id)
+    clues = (
+        clues.annotate(
+            distance=CosineDistance("image_embedding", HalfVector(embedding))
+        )
+        .order_by("distance")
+        .only("id", "treasure_hunt_id", "order")[:limit]
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SET LOCAL hnsw.ef_search = %s", [int(settings.PHOTO_MATCH_EF_SEARCH)]
+            )
+        clues = list(clues)
+    for clue in clues:
+        clue.similarity = 1 - clue.distance
+    return clues
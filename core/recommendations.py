@@ -0,0 +1,66 @@
+"""
+Recommendations of hunts similar to a hunt.
+
+The centroid of each hunt, the mean of the embeddings of its clue images, is
+refreshed for the hunts whose clue embeddings change (see
+TreasureHuntQuerySet.refresh_centroids). The hunts whose centroids are the
+closest to the centroid of a hunt are found with the HNSW index on
+TreasureHunt.centroid, and cached under the catalog version (see core.cache),
+so the search only runs once per hunt until the catalog changes or the entry
+expires. The hunts the user already plays or created are filtered out of the
+cached list when rendering it.
+"""
+
+from django.conf import settings
+
+from . import cache as hunt_cache
+from .cache import CATALOG_VERSION_KEY
+from .models import TreasureHunt, UserProgress
+
+
+def similar_hunts(hunt):
+    """
+    Return the SIMILAR_HUNTS_CANDIDATES public hunts the most similar to a hunt.
+
+    Args:
+        hunt: The TreasureHunt
+
+    Returns:
+        list: The similar hunts, the most similar first; empty if the hunt has
+        no clue image embedding
+    """
+    if hunt.centroid is None:
+        return []
+    (catalog_version,) = hunt_cache.get_versions(CATALOG_VERSION_KEY)
+    key = f"similar:{catalog_version}:{hunt.pk}"
+    cached = hunt_cache.get_many("similar_hunts", [key])
+    if key in cached:
+        return cached[key]
+
+    hunts = list(
+        TreasureHunt.objects.similar_to(hunt).only(
+            "id", "title", "description", "image", "image_variants", "creator_id"
+        )[: settings.SIMILAR_HUNTS_CANDIDATES]
+    )
+    hunt_cache.set_many({key: hunts})
+    return hunts
+
+
+def recommended_hunts(hunt, user):
+    """
+    Return up to SIMILAR_HUNTS_COUNT hunts similar to a hunt that the user
+    neither plays nor created.
+    """
+    hunts = similar_hunts(hunt)
+    if not hunts:
+        return []
+    joined = set(
+        UserProgress.objects.filter(
+            user=user, treasure_hunt_id__in=[similar.pk for similar in hunts]
+        ).values_list("treasure_hunt_id", flat=True)
+    )
+    return [
+        similar
+        for similar in hunts
+        if similar.pk not in joined and similar.creator_id != user.id
+    ][: settings.SIMILAR_HUNTS_COUNT]
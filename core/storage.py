@@ -0,0 +1,211 @@
+"""
+Bulk and concurrent operations on the file storage.
+
+Deleting files one by one costs one S3 request each, while a DeleteObjects
+request removes up to DELETE_BATCH_SIZE keys at once. Uploads of different
+files are independent and mostly wait on the network, so they run in a thread
+pool bounded by STORAGE_MAX_WORKERS. Storages other than S3, such as
+FileSystemStorage in development, fall back to one delete per file.
+
+On S3, browsers can also upload files straight to the bucket with presigned
+POST forms, so their bytes never go through the application.
+
+Every S3 URL is signed, which costs far more than building a string, and a
+catalog page renders several URLs per hunt. URLCachingS3Storage, the default
+storage, keeps the URL of each key for MEDIA_URL_CACHE_TIMEOUT seconds, well
+before its signature expires.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of keys of an S3 DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+
+
+class URLCachingS3Storage(S3Boto3Storage):
+    """
+    S3 storage reusing the signed URL of a file for MEDIA_URL_CACHE_TIMEOUT seconds.
+
+    Cached URLs always remain valid for at least HUNT_CACHE_TIMEOUT seconds, so
+    that pages cached with them never link to an expired URL. At most
+    MEDIA_URL_CACHE_SIZE URLs are kept per process; since they all live for
+    the same time, the oldest ones are also the first to expire.
+    """
+
+    def __init__(self, **settings_overrides):
+        super().__init__(**settings_overrides)
+        self._urls = OrderedDict()
+        self._urls_lock = threading.Lock()
+
+    def url_cache_timeout(self):
+        """
+        Return the number of seconds a URL is reused.
+        """
+        timeout = settings.MEDIA_URL_CACHE_TIMEOUT
+        if self.querystring_auth:
+            timeout = min(
+                timeout, self.querystring_expire - settings.HUNT_CACHE_TIMEOUT
+            )
+        return max(timeout, 0)
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        # Only the plain URLs used to display files are cached
+        if parameters or expire is not None or http_method is not None:
+            return super().url(name, parameters, expire, http_method)
+
+        now = time.monotonic()
+        with self._urls_lock:
+            cached = self._urls.get(name)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        url = super().url(name)
+        with self._urls_lock:
+            self._urls[name] = (url, now + self.url_cache_timeout())
+            self._urls.move_to_end(name)
+            while self._urls and (
+                len(self._urls) > settings.MEDIA_URL_CACHE_SIZE
+                or next(iter(self._urls.values()))[1] <= now
+            ):
+                self._urls.popitem(last=False)
+        return url
+
+    def clear_url_cache(self):
+        """
+        Forget the cached URLs.
+        """
+        with self._urls_lock:
+            self._urls.clear()
+
+
+def delete_files(names, storage=None):
+    """
+    Delete files from the storage, batching the deletions on S3.
+
+    Deletion is best effort: errors are logged rather than raised, so that
+    a storage failure never prevents deleting the rows that referenced the
+    files.
+
+    Args:
+        names: Storage names of the files; empty and repeated names are ignored
+        storage: The storage, default_storage by default
+
+    Returns:
+        list: The names of the files that could not be deleted
+    """
+    storage = storage or default_storage
+    names = list(dict.fromkeys(name for name in names if name))
+    if not isinstance(storage, S3Boto3Storage):
+        failed = []
+        for name in names:
+            try:
+                storage.delete(name)
+            except Exception as e:
+                logger.warning("Error deleting %s: %s", name, e)
+                failed.append(name)
+        return failed
+
+    failed = []
+    for start in range(0, len(names), DELETE_BATCH_SIZE):
+        batch = names[start : start + DELETE_BATCH_SIZE]
+        keys = {storage._normalize_name(clean_name(name)): name for name in batch}
+        try:
+            response = storage.bucket.delete_objects(
+                Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True}
+            )
+        except Exception as e:
+            logger.warning("Error deleting %d files: %s", len(batch), e)
+            failed.extend(batch)
+            continue
+        # Missing keys are not errors, only access or server errors are reported
+        for error in response.get("Errors", []):
+            logger.warning("Error deleting %s: %s", error["Key"], error["Message"])
+            failed.append(keys.get(error["Key"], error["Key"]))
+    return failed
+
+
+def save_files(files, storage=None, max_workers=None):
+    """
+    Save files to the storage concurrently.
+
+    Args:
+        files: Sequence of (name, content) pairs, as passed to Storage.save
+        storage: The storage, default_storage by default
+        max_workers: Maximum number of concurrent uploads, STORAGE_MAX_WORKERS
+            by default
+
+    Returns:
+        list: The names the files were saved under, in the same order
+    """
+    storage = storage or default_storage
+    files = list(files)
+    if len(files) <= 1:
+        return [storage.save(name, content) for name, content in files]
+
+    max_workers = min(max_workers or settings.STORAGE_MAX_WORKERS, len(files))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda file: storage.save(*file), files))
+
+
+def missing_files(names, storage=None, max_workers=None):
+    """
+    Return the names of the files that do not exist in the storage.
+
+    The files are checked concurrently, like save_files uploads them.
+    """
+    storage = storage or default_storage
+    names = list(names)
+    if len(names) <= 1:
+        return [name for name in names if not storage.exists(name)]
+
+    max_workers = min(max_workers or settings.STORAGE_MAX_WORKERS, len(names))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        exists = list(executor.map(storage.exists, names))
+    return [name for name, found in zip(names, exists) if not found]
+
+
+def supports_presigned_uploads(storage=None):
+    """
+    Check whether browsers can upload files directly to the storage.
+    """
+    return isinstance(storage or default_storage, S3Boto3Storage)
+
+
+def presigned_upload(name, content_type, storage=None):
+    """
+    Create a presigned POST form uploading one file directly to S3.
+
+    The form only accepts a file of the given content type, of at most
+    MAX_UPLOAD_SIZE bytes, uploaded within UPLOAD_URL_EXPIRE seconds.
+
+    Args:
+        name: Storage name the file will be saved under
+        content_type: MIME type of the file
+        storage: The storage, default_storage by default
+
+    Returns:
+        dict: The "url" to post the form to and the "fields" to send along
+        with the file, which must be the last field of the form
+    """
+    storage = storage or default_storage
+    return storage.bucket.meta.client.generate_presigned_post(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(clean_name(name)),
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, settings.MAX_UPLOAD_SIZE],
+        ],
+        ExpiresIn=settings.UPLOAD_URL_EXPIRE,
+    )
@@ -0,0 +1,71 @@
+"""
+Template tags rendering the responsive variants of the hunt and clue images.
+
+Usage:
+
+    {% load images %}
+    {% responsive_image hunt.image hunt.image_variants size="card" sizes="33vw" %}
+"""
+
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from core.utils import IMAGE_VARIANTS
+
+register = template.Library()
+
+
+def srcset(variants, image_format):
+    """
+    Return the srcset attribute listing the variants of an image in a format.
+    """
+    entries = {}
+    for variant in variants.values():
+        name = variant.get(image_format)
+        if name:
+            entries[variant["width"]] = name
+    return ", ".join(
+        f"{default_storage.url(name)} {width}w"
+        for width, name in sorted(entries.items())
+    )
+
+
+@register.simple_tag
+def responsive_image(image, variants, size="card", sizes="100vw", **attrs):
+    """
+    Render an image as a <picture> serving its variants in WebP with a JPEG fallback.
+
+    Browsers pick the smallest variant that fills the slot described by sizes.
+    Images without variants (uploaded before they were generated) are rendered
+    as a plain <img> of the original image.
+
+    Args:
+        image: The image field
+        variants: The variants of the image, as stored by core.jobs
+        size: Name of the variant used by browsers that ignore srcset
+        sizes: The sizes attribute, i.e. the width of the image in the layout
+        attrs: Other attributes of the <img> element, such as alt or class
+
+    Returns:
+        str: The HTML of the image, or an empty string if there is no image
+    """
+    if not image:
+        return ""
+    if not variants or size not in IMAGE_VARIANTS:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    sources = format_html(
+        '<source type="image/webp" srcset="{}" sizes="{}">',
+        srcset(variants, "webp"),
+        sizes,
+    )
+    fallback = format_html(
+        '<img src="{}" srcset="{}" sizes="{}"{}>',
+        default_storage.url(variants[size]["jpeg"]),
+        srcset(variants, "jpeg"),
+        sizes,
+        flatatt(attrs),
+    )
+    return format_html("<picture>{}{}</picture>", sources, fallback)
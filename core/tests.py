@@ -1,3 +1,130 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from .models import Clue, TreasureHunt
+
+
+def hunt_form(clue_count, **clue_overrides):
+    """
+    Return the POST data of the hunt creation form with some clues.
+
+    clue_overrides maps the index of a clue to the fields replacing its own.
+    """
+    data = {
+        "title": "Hunt",
+        "description": "A hunt",
+        "is_public": "on",
+        "points_per_clue": "10",
+        "completion_points": "50",
+    }
+    for index in range(clue_count):
+        fields = {
+            "hint_text": f"Hint {index}",
+            "unlock_message": f"Unlocked {index}",
+            "latitude": str(-0.18 + index * 0.001),
+            "longitude": str(-78.46 + index * 0.001),
+            "radius": "15",
+        }
+        fields.update(clue_overrides.get(index, {}))
+        for name, value in fields.items():
+            data[f"clues[{index}][{name}]"] = value
+    return data
+
+
+class CreateHuntTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("creator", password="secret")
+        self.client.force_login(self.user)
+
+    def create_hunt(self, data):
+        return self.client.post(reverse("create_hunt"), data)
+
+    def test_query_count_does_not_grow_with_clues(self):
+        with CaptureQueriesContext(connection) as few_clues:
+            response = self.create_hunt(hunt_form(2))
+        self.assertTrue(response.json()["success"])
+
+        with self.assertNumQueries(len(few_clues)):
+            response = self.create_hunt(hunt_form(50))
+        self.assertTrue(response.json()["success"])
+
+        clue_ids = response.json()["clue_ids"]
+        self.assertEqual(len(clue_ids), 50)
+        hunt = TreasureHunt.objects.get(clues__id=clue_ids[0])
+        self.assertEqual(hunt.clues.count(), 50)
+
+    def test_clues_are_created_in_order(self):
+        response = self.create_hunt(hunt_form(3))
+        clue_ids = response.json()["clue_ids"]
+
+        clues = Clue.objects.order_by("order")
+        self.assertEqual([str(clue.id) for clue in clues], clue_ids)
+        self.assertEqual(
+            [clue.hint_text for clue in clues], ["Hint 0", "Hint 1", "Hint 2"]
+        )
+        hunt = TreasureHunt.objects.get()
+        self.assertEqual(hunt.start_latitude, clues[0].latitude)
+        self.assertEqual(hunt.start_longitude, clues[0].longitude)
+
+    def test_invalid_clue_creates_nothing(self):
+        for invalid in ({"latitude": "north"}, {"longitude": ""}, {"latitude": "95"}):
+            with self.subTest(invalid=invalid):
+                response = self.create_hunt(hunt_form(5, **{3: invalid}))
+
+                self.assertFalse(response.json()["success"])
+                self.assertIn("Clue 4", response.json()["error"])
+                self.assertFalse(TreasureHunt.objects.exists())
+                self.assertFalse(Clue.objects.exists())
+
+
+class EditHuntTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("creator", password="secret")
+        self.client.force_login(self.user)
+
+    def create_hunt(self, clue_count):
+        response = self.client.post(reverse("create_hunt"), hunt_form(clue_count))
+        clue_ids = response.json()["clue_ids"]
+        return TreasureHunt.objects.get(clues__id=clue_ids[0]), clue_ids
+
+    def keep_first_clues(self, hunt, clue_ids, count):
+        # Submit the edition form with the first clues of the hunt only
+        data = hunt_form(count)
+        for index, clue_id in enumerate(clue_ids[:count]):
+            data[f"clues[{index}][id]"] = clue_id
+        return self.client.post(reverse("edit_hunt", args=[hunt.id]), data)
+
+    def test_query_count_does_not_grow_with_removed_clues(self):
+        hunt, clue_ids = self.create_hunt(5)
+        with CaptureQueriesContext(connection) as few_removed:
+            response = self.keep_first_clues(hunt, clue_ids, 2)
+        self.assertEqual(response.json()["changes"]["deleted"], 3)
+
+        hunt, clue_ids = self.create_hunt(50)
+        with self.assertNumQueries(len(few_removed)):
+            response = self.keep_first_clues(hunt, clue_ids, 2)
+        self.assertEqual(response.json()["changes"]["deleted"], 48)
+
+        remaining = hunt.clues.order_by("order").values_list("pk", flat=True)
+        self.assertEqual([str(pk) for pk in remaining], clue_ids[:2])
+
+    def test_removing_clues_updates_the_hunt(self):
+        hunt, clue_ids = self.create_hunt(4)
+        clues_version = hunt.clues_version
+
+        data = hunt_form(1)
+        data["clues[0][id]"] = clue_ids[3]
+        data["clues[0][latitude]"] = str(-0.18 + 3 * 0.001)
+        data["clues[0][longitude]"] = str(-78.46 + 3 * 0.001)
+        response = self.client.post(reverse("edit_hunt", args=[hunt.id]), data)
+        self.assertEqual(response.json()["changes"]["deleted"], 3)
+
+        hunt.refresh_from_db()
+        last_clue = Clue.objects.get()
+        self.assertEqual(str(last_clue.pk), clue_ids[3])
+        self.assertEqual(hunt.clues_version, clues_version + 1)
+        self.assertEqual(hunt.start_latitude, last_clue.latitude)
+        self.assertEqual(hunt.start_longitude, last_clue.longitude)
@@ -0,0 +1,215 @@
+"""
+Throttling and short-circuiting of location checks.
+
+Location checks go through two guards before touching the database:
+
+- A token bucket per user and hunt, refilled at LOCATION_CHECK_RATE tokens per
+  second up to LOCATION_CHECK_BURST tokens, limits how often a player can ask
+  for a verification. Photo checks, which are far more expensive, have a
+  bucket of their own (see check_photo). A rate of 0 disables the bucket.
+- After a failed verification, the location and radius of the current clue are
+  cached together with the catalog version and the user's progress version
+  (see core.cache). While neither the clues nor the progress have changed, the
+  next fixes are checked against that cached target, and fixes outside its
+  radius are rejected without any query.
+
+The state lives in the cache configured under settings.HUNT_CACHE_ALIAS, which
+must be shared by every worker for the throttle to hold (see core.checks).
+Updates of a bucket are not atomic, which at worst lets a few extra requests
+through. With a backend local to each process, each worker has buckets of its
+own, so a player gets a burst per worker, and a worker that did not handle the
+advance of a player would keep comparing their fixes with the clue they
+already solved, so the cached targets are not used at all.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+from .cache import (
+    CATALOG_VERSION_KEY,
+    get_cache,
+    get_versions,
+    is_shared_cache,
+    progress_version_key,
+)
+from .geo import haversine_many_m
+
+EVALUATE = "evaluate"
+THROTTLED = "throttled"
+TOO_FAR = "too_far"
+
+
+class LocationCheckStats:
+    """
+    Thread-safe counters of the location checks handled by this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {EVALUATE: 0, THROTTLED: 0, TOO_FAR: 0}
+
+    def record(self, action):
+        """
+        Count a location check by the action taken for it.
+        """
+        with self._lock:
+            self._counts[action] += 1
+
+    def snapshot(self):
+        """
+        Return a copy of the counters.
+        """
+        with self._lock:
+            return {
+                "evaluated": self._counts[EVALUATE],
+                "rejected_throttled": self._counts[THROTTLED],
+                "rejected_too_far": self._counts[TOO_FAR],
+            }
+
+
+stats = LocationCheckStats()
+
+
+class LocationCheck:
+    """
+    Decision taken for a location check before evaluating it against the database.
+    """
+
+    __slots__ = ("action", "distance", "versions", "retry_after")
+
+    def __init__(self, action, distance=None, versions=None, retry_after=0):
+        self.action = action
+        self.distance = distance
+        self.versions = versions
+        self.retry_after = retry_after
+
+
+def _bucket_key(user_id, hunt_id):
+    return f"throttle:{user_id}:{hunt_id}:bucket"
+
+
+def _target_key(user_id, hunt_id):
+    return f"throttle:{user_id}:{hunt_id}:target"
+
+
+def _photo_bucket_key(user_id, hunt_id):
+    return f"throttle:{user_id}:{hunt_id}:photo_bucket"
+
+
+def _take_token(cache, key, entry, rate, burst):
+    # Return the seconds to wait before the bucket has a token, 0 if one was taken
+    if rate <= 0:
+        return 0
+    now = time.time()
+    tokens, updated_at = entry or (burst, now)
+    tokens = min(burst, tokens + (now - updated_at) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate
+    cache.set(key, (tokens - 1, now), timeout=int(burst / rate) + 1)
+    return 0
+
+
+def check_location(user_id, hunt_id, lats, lngs):
+    """
+    Decide whether a location check must be evaluated against the database.
+
+    Consumes a token from the bucket of the user in the hunt, then compares the
+    fixes with the cached target, if any. Costs one cache read and one write.
+
+    Args:
+        user_id: Id of the user
+        hunt_id: Id of the hunt
+        lats, lngs: Sequences with the coordinates of the fixes
+
+    Returns:
+        LocationCheck: EVALUATE, THROTTLED (with the seconds to wait) or
+        TOO_FAR (with the distance to the cached target)
+    """
+    cache = get_cache()
+    bucket_key = _bucket_key(user_id, hunt_id)
+    target_key = _target_key(user_id, hunt_id)
+    version_keys = [CATALOG_VERSION_KEY, progress_version_key(user_id)]
+    entries = cache.get_many([bucket_key, target_key, *version_keys])
+
+    retry_after = _take_token(
+        cache,
+        bucket_key,
+        entries.get(bucket_key),
+        settings.LOCATION_CHECK_RATE,
+        settings.LOCATION_CHECK_BURST,
+    )
+    if retry_after:
+        check = LocationCheck(THROTTLED, retry_after=retry_after)
+        stats.record(check.action)
+        return check
+
+    if not is_shared_cache():
+        check = LocationCheck(EVALUATE)
+        stats.record(check.action)
+        return check
+
+    versions = tuple(entries.get(key) for key in version_keys)
+    if None in versions:
+        versions = tuple(get_versions(*version_keys))
+    target = entries.get(target_key)
+    if target and target[0] == versions:
+        _, clue_lat, clue_lng, radius = target
+        distance = float(haversine_many_m(clue_lat, clue_lng, lats, lngs).min())
+        if distance > radius:
+            check = LocationCheck(TOO_FAR, distance, versions)
+            stats.record(check.action)
+            return check
+
+    check = LocationCheck(EVALUATE, versions=versions)
+    stats.record(check.action)
+    return check
+
+
+def check_photo(user_id, hunt_id):
+    """
+    Decide whether a photo check can be evaluated.
+
+    Photo checks run an inference of the embedding model, so they have their
+    own bucket, refilled at PHOTO_CHECK_RATE tokens per second up to
+    PHOTO_CHECK_BURST tokens.
+
+    Returns:
+        LocationCheck: EVALUATE or THROTTLED (with the seconds to wait)
+    """
+    cache = get_cache()
+    key = _photo_bucket_key(user_id, hunt_id)
+    retry_after = _take_token(
+        cache,
+        key,
+        cache.get(key),
+        settings.PHOTO_CHECK_RATE,
+        settings.PHOTO_CHECK_BURST,
+    )
+    if retry_after:
+        return LocationCheck(THROTTLED, retry_after=retry_after)
+    return LocationCheck(EVALUATE)
+
+
+def remember_target(user_id, hunt_id, check, clue_lat, clue_lng, radius):
+    """
+    Cache the clue a user failed to reach, so the next far fixes skip the database.
+
+    The target is tied to the versions read by check_location, so it is
+    ignored as soon as the clues or the progress of the user change.
+
+    Args:
+        user_id: Id of the user
+        hunt_id: Id of the hunt
+        check: The LocationCheck returned by check_location for the failed fixes
+        clue_lat, clue_lng, radius: Location and radius of the current clue
+    """
+    if not is_shared_cache():
+        return
+    get_cache().set(
+        _target_key(user_id, hunt_id),
+        (check.versions, clue_lat, clue_lng, radius),
+        timeout=settings.HUNT_CACHE_TIMEOUT,
+    )
+
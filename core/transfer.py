@@ -0,0 +1,399 @@
+"""
+Export and import of hunts as NDJSON.
+
+Each line of the stream is a JSON object describing one hunt along with its
+clues and, optionally, the progress of its players:
+
+    {"id": ..., "creator": "username", "title": ..., "image": "images/ab/...",
+     "clues": [{"id": ..., "order": 1, "hint_text": ..., ...}, ...],
+     "progress": [{"user": "username", "current_clue": 2, ...}, ...]}
+
+Images are carried by their storage key, never by their bytes. An imported key
+stored as an ImageBlob takes a reference to it, along with its embedding, so
+the image is shared with the exported hunt instead of being copied. Other keys
+get a blob of their own, without digest like the images stored before
+deduplication, so that their files are only deleted with the last hunt or clue
+using them; their embeddings are left to the embed_clues command. The progress
+references users by username and the current clue by its order.
+
+Exports stream the hunts with iterator() and import them in batches written
+with bulk_create, so neither keeps more than a batch of hunts in memory.
+"""
+
+import json
+import uuid
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch
+from django.utils.dateparse import parse_datetime
+
+from .cache import bump_catalog_version, bump_progress_version
+from .geo import geohash_encode
+from .models import Clue, ImageBlob, TreasureHunt, UserProgress
+
+# Hunts fetched or written at once
+TRANSFER_BATCH_SIZE = 500
+
+HUNT_FIELDS = (
+    "title",
+    "description",
+    "is_active",
+    "is_public",
+    "points_per_clue",
+    "completion_points",
+    "completion_message",
+)
+CLUE_FIELDS = (
+    "order",
+    "hint_text",
+    "unlock_message",
+    "latitude",
+    "longitude",
+    "radius",
+)
+PROGRESS_FIELDS = ("is_completed", "total_points")
+
+
+def hunt_record(hunt, include_progress=False):
+    """
+    Return the JSON-serializable record of a hunt.
+
+    Args:
+        hunt: The TreasureHunt, with its clues ordered and, if the progress is
+            included, its progress with their users prefetched
+        include_progress: Whether to include the progress of the players
+
+    Returns:
+        dict: The record of the hunt
+    """
+    clues = list(hunt.clues.all())
+    record = {
+        "id": str(hunt.id),
+        "creator": hunt.creator.username,
+        **{name: getattr(hunt, name) for name in HUNT_FIELDS},
+        "end_date": hunt.end_date,
+        "image": hunt.image.name or None,
+        "image_variants": hunt.image_variants,
+        "clues": [
+            {
+                "id": str(clue.id),
+                **{name: getattr(clue, name) for name in CLUE_FIELDS},
+                "reference_image": clue.reference_image.name or None,
+                "reference_image_variants": clue.reference_image_variants,
+            }
+            for clue in clues
+        ],
+    }
+    if include_progress:
+        orders = {clue.id: clue.order for clue in clues}
+        record["progress"] = [
+            {
+                "user": progress.user.username,
+                "current_clue": orders[progress.current_clue_id],
+                **{name: getattr(progress, name) for name in PROGRESS_FIELDS},
+                "completed_at": progress.completed_at,
+            }
+            for progress in hunt.userprogress_set.all()
+        ]
+    return record
+
+
+def export_hunts(out, hunts=None, include_progress=False):
+    """
+    Write hunts to a text stream, one NDJSON line per hunt.
+
+    Args:
+        out: The text stream
+        hunts: QuerySet of the hunts to export, all the hunts if None
+        include_progress: Whether to include the progress of the players
+
+    Returns:
+        int: The number of hunts written
+    """
+    if hunts is None:
+        hunts = TreasureHunt.objects.all()
+    prefetches = [
+        Prefetch(
+            "clues", queryset=Clue.objects.defer("image_embedding").order_by("order")
+        )
+    ]
+    if include_progress:
+        prefetches.append(
+            Prefetch(
+                "userprogress_set",
+                queryset=UserProgress.objects.select_related("user"),
+            )
+        )
+    hunts = (
+        hunts.select_related("creator")
+        .defer("centroid")
+        .order_by("created_at", "id")
+        .prefetch_related(*prefetches)
+    )
+    count = 0
+    for hunt in hunts.iterator(chunk_size=TRANSFER_BATCH_SIZE):
+        record = hunt_record(hunt, include_progress)
+        out.write(json.dumps(record, cls=DjangoJSONEncoder) + "\n")
+        count += 1
+    return count
+
+
+def _parse_datetime(value):
+    return parse_datetime(value) if value else None
+
+
+def _parse_record(line_number, line):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Line {line_number} is not valid JSON: {e}") from e
+
+
+def _record_error(line_number, record, message):
+    hunt = record.get("id") or record.get("title")
+    return ValueError(f"Line {line_number} (hunt {hunt}): {message}")
+
+
+def _check_new_ids(numbered_records):
+    # Name the first record whose hunt or clues already exist, rather than
+    # failing the whole batch with an IntegrityError
+    hunt_ids = {record.get("id") for _, record in numbered_records} - {None}
+    clue_ids = {
+        clue.get("id")
+        for _, record in numbered_records
+        for clue in record.get("clues", [])
+    } - {None}
+    existing = set(
+        TreasureHunt.objects.filter(pk__in=hunt_ids).values_list("pk", flat=True)
+    )
+    existing.update(Clue.objects.filter(pk__in=clue_ids).values_list("pk", flat=True))
+    existing = {str(pk) for pk in existing}
+
+    for line_number, record in numbered_records:
+        ids = [record.get("id")]
+        ids += [clue.get("id") for clue in record.get("clues", [])]
+        taken = [pk for pk in ids if pk in existing]
+        if taken:
+            raise _record_error(
+                line_number,
+                record,
+                f"{', '.join(taken)} already exist, import them with new ids",
+            )
+
+
+def _import_batch(numbered_records, creator=None, new_ids=False):
+    """
+    Create the hunts, clues and progress of a batch of records in one transaction.
+
+    Args:
+        numbered_records: List of (line number, record) pairs
+
+    Returns:
+        Counter: The number of hunts, clues and progress created
+
+    Raises:
+        ValueError: If a record references an unknown user or clue, has two
+            clues of the same order or, without new_ids, an existing id
+    """
+    records = [record for _, record in numbered_records]
+    usernames = {
+        progress.get("user")
+        for record in records
+        for progress in record.get("progress", [])
+    }
+    if creator is None:
+        usernames.update(record.get("creator") for record in records)
+    users = dict(
+        User.objects.filter(username__in=usernames - {None}).values_list(
+            "username", "id"
+        )
+    )
+    for line_number, record in numbered_records:
+        if creator is None and record.get("creator") not in users:
+            raise _record_error(
+                line_number, record, f"Unknown creator: {record.get('creator')}"
+            )
+        for progress in record.get("progress", []):
+            if progress.get("user") not in users:
+                raise _record_error(
+                    line_number, record, f"Unknown user: {progress.get('user')}"
+                )
+    if not new_ids:
+        _check_new_ids(numbered_records)
+
+    # The variants of each image, by name
+    image_variants = {
+        record.get("image"): record.get("image_variants") for record in records
+    }
+    image_variants.update(
+        (clue.get("reference_image"), clue.get("reference_image_variants"))
+        for record in records
+        for clue in record.get("clues", [])
+    )
+    image_variants = {
+        name: variants for name, variants in image_variants.items() if name
+    }
+
+    hunts, clues, progresses = [], [], []
+    with transaction.atomic():
+        # Lock the blobs so that they cannot be released and deleted meanwhile
+        blobs = {
+            blob.image: blob
+            for blob in ImageBlob.objects.filter(image__in=image_variants)
+            .select_for_update()
+            .only("id", "image", "embedding")
+        }
+        new_blobs = [
+            ImageBlob(image=name, variants=variants or {}, references=0)
+            for name, variants in image_variants.items()
+            if name not in blobs
+        ]
+        ImageBlob.objects.bulk_create(new_blobs)
+        blobs.update((blob.image, blob) for blob in new_blobs)
+        references = Counter()
+
+        for line_number, record in numbered_records:
+            hunt = TreasureHunt(
+                id=(not new_ids and record.get("id")) or uuid.uuid4(),
+                creator_id=creator.id if creator else users[record["creator"]],
+                **{name: record[name] for name in HUNT_FIELDS if name in record},
+                end_date=_parse_datetime(record.get("end_date")),
+                image=record.get("image"),
+                image_variants=record.get("image_variants") or {},
+            )
+            blob = blobs.get(record.get("image"))
+            if blob:
+                hunt.image_blob = blob
+                references[blob.id] += 1
+            hunts.append(hunt)
+
+            hunt_clues = {}
+            for clue_record in record.get("clues", []):
+                clue = Clue(
+                    id=(not new_ids and clue_record.get("id")) or uuid.uuid4(),
+                    treasure_hunt=hunt,
+                    **{
+                        name: clue_record[name]
+                        for name in CLUE_FIELDS
+                        if name in clue_record
+                    },
+                    reference_image=clue_record.get("reference_image"),
+                    reference_image_variants=(
+                        clue_record.get("reference_image_variants") or {}
+                    ),
+                )
+                blob = blobs.get(clue_record.get("reference_image"))
+                if blob:
+                    clue.reference_image_blob = blob
+                    clue.image_embedding = blob.embedding
+                    references[blob.id] += 1
+                if clue.order in hunt_clues:
+                    raise _record_error(
+                        line_number, record, f"Two clues have the order {clue.order}"
+                    )
+                hunt_clues[clue.order] = clue
+            clues += hunt_clues.values()
+
+            # bulk_create bypasses the signals keeping the start location in sync
+            if hunt_clues:
+                first_clue = hunt_clues[min(hunt_clues)]
+                hunt.start_latitude = first_clue.latitude
+                hunt.start_longitude = first_clue.longitude
+                hunt.start_geohash = geohash_encode(
+                    first_clue.latitude, first_clue.longitude
+                )
+
+            for progress_record in record.get("progress", []):
+                current_clue = hunt_clues.get(progress_record.get("current_clue"))
+                if current_clue is None:
+                    raise _record_error(
+                        line_number,
+                        record,
+                        f"The progress of {progress_record['user']} is at clue "
+                        f"{progress_record.get('current_clue')}, which is not in "
+                        "the hunt",
+                    )
+                progresses.append(
+                    UserProgress(
+                        user_id=users[progress_record["user"]],
+                        treasure_hunt=hunt,
+                        current_clue=current_clue,
+                        **{
+                            name: progress_record[name]
+                            for name in PROGRESS_FIELDS
+                            if name in progress_record
+                        },
+                        completed_at=_parse_datetime(
+                            progress_record.get("completed_at")
+                        ),
+                    )
+                )
+
+        TreasureHunt.objects.bulk_create(hunts)
+        Clue.objects.bulk_create(clues)
+        UserProgress.objects.bulk_create(progresses)
+        for blob_id, count in references.items():
+            ImageBlob.objects.filter(pk=blob_id).update(
+                references=F("references") + count
+            )
+        TreasureHunt.objects.filter(
+            pk__in={
+                clue.treasure_hunt_id
+                for clue in clues
+                if clue.image_embedding is not None
+            }
+        ).refresh_centroids()
+
+        for user_id in {progress.user_id for progress in progresses}:
+            transaction.on_commit(
+                lambda user_id=user_id: bump_progress_version(user_id)
+            )
+
+    return Counter(hunts=len(hunts), clues=len(clues), progress=len(progresses))
+
+
+def import_hunts(lines, creator=None, new_ids=False, batch_size=TRANSFER_BATCH_SIZE):
+    """
+    Create the hunts of NDJSON lines, as written by export_hunts.
+
+    Each batch is created in its own transaction, so an error, such as an
+    existing id or an unknown user, stops the import after the batches already
+    created, with an error naming the line of the invalid record.
+
+    Args:
+        lines: Iterable of the NDJSON lines
+        creator: User made the creator of every hunt, instead of the users
+            named by the records
+        new_ids: Whether to give new ids to the hunts and clues, to import
+            copies of exported hunts into the same database
+        batch_size: Number of hunts created at once
+
+    Returns:
+        Counter: The number of hunts, clues and progress created
+
+    Raises:
+        ValueError: If a line is invalid, naming it
+    """
+    records = (
+        (line_number, _parse_record(line_number, line))
+        for line_number, line in enumerate(lines, 1)
+        if line.strip()
+    )
+    totals = Counter()
+    try:
+        while batch := list(islice(records, batch_size)):
+            try:
+                totals += _import_batch(batch, creator, new_ids)
+            except IntegrityError as e:
+                # Ids taken meanwhile or repeated in the batch itself
+                raise ValueError(
+                    f"Lines {batch[0][0]} to {batch[-1][0]} could not be imported: {e}"
+                ) from e
+    finally:
+        if totals["hunts"]:
+            bump_catalog_version()
+    return totals
@@ -7,14 +7,30 @@ from . import views
 
 urlpatterns = [
     path("", views.treasure_hunt_list, name="treasure_hunt_list"),
+    path("api/hunts/", views.treasure_hunt_list_json, name="treasure_hunt_list_json"),
+    path("api/hunts/nearby/", views.nearby_hunts, name="nearby_hunts"),
+    path("cache/stats/", views.cache_stats, name="cache_stats"),
+    path(
+        "location/stats/", views.location_check_stats, name="location_check_stats"
+    ),
     path("login/", views.login_view, name="login"),
     path("logout/", views.logout_view, name="logout"),
     path("hunt/<uuid:hunt_id>/", views.view_hunt, name="view_hunt"),
     path("hunt/<uuid:hunt_id>/details/", views.hunt_details, name="hunt_details"),
+    path("hunt/<uuid:hunt_id>/jobs/", views.hunt_jobs, name="hunt_jobs"),
+    path("hunt/<uuid:hunt_id>/uploads/", views.hunt_uploads, name="hunt_uploads"),
+    path(
+        "hunt/<uuid:hunt_id>/uploads/finalize/",
+        views.finalize_hunt_uploads,
+        name="finalize_hunt_uploads",
+    ),
     path("hunt/<uuid:hunt_id>/inscribe/", views.inscribe_hunt, name="inscribe_hunt"),
+    path("clue/<uuid:clue_id>/reorder/", views.reorder_clue, name="reorder_clue"),
     path(
         "verify-location/<uuid:hunt_id>/", views.verify_location, name="verify_location"
     ),
+    path("verify-trail/<uuid:hunt_id>/", views.verify_trail, name="verify_trail"),
+    path("verify-photo/<uuid:hunt_id>/", views.verify_photo, name="verify_photo"),
     path("create/", views.create_hunt, name="create_hunt"),
     path("edit/<uuid:hunt_id>/", views.edit_hunt, name="edit_hunt"),
     path("delete/<uuid:hunt_id>/", views.delete_hunt, name="delete_hunt"),
@@ -25,6 +41,11 @@ urlpatterns = [
         views.view_hunt_participants,
         name="hunt_participants",
     ),
+    path(
+        "hunt/<uuid:hunt_id>/leaderboard/stream/",
+        views.hunt_leaderboard_stream,
+        name="hunt_leaderboard_stream",
+    ),
     path(
         "hunt/<uuid:hunt_id>/completion/",
         views.hunt_completion,
@@ -2,59 +2,141 @@
 Utils for the core app.
 """
 
-# import torch
-# from transformers import CLIPProcessor, CLIPModel
-from PIL import Image
+import functools
+import math
+import os
+import tempfile
 
-# import numpy as np  # Import numpy if you want the option to return an array
-from io import BytesIO
+from PIL import Image, ImageOps
+
+from django.conf import settings
 from django.core.files import File
 
+# Maximum number of times an image is downscaled to fit in the size budget
+MAX_DOWNSCALE_STEPS = 4
+# Size above which optimized images are written to disk instead of memory
+SPOOL_MAX_SIZE = 1024 * 1024
+# Model computing the 512-dimension embeddings of the clue images
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+# Width and height in pixels of the images seen by the CLIP model
+CLIP_IMAGE_SIZE = 224
+# Maximum width and height in pixels of the responsive variants of the images
+IMAGE_VARIANTS = {"thumbnail": 320, "card": 640, "full": 1280}
+# Pillow format and file extension of each format the variants are saved in
+VARIANT_FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+VARIANT_QUALITY = 80
+
+
+@functools.lru_cache(maxsize=None)
+def load_clip():
+    """
+    Load the CLIP processor and model, once per process.
+
+    Inference uses at most EMBEDDING_THREADS CPU threads, so that a worker
+    does not starve the other processes of the machine.
+    """
+    # torch and transformers are heavy optional dependencies, only needed by
+    # the embedding worker (IMAGE_EMBEDDINGS_ENABLED) and, for photo checks,
+    # the web server (PHOTO_VERIFICATION_ENABLED)
+    import torch
+    from transformers import CLIPModel, CLIPProcessor
+
+    if settings.EMBEDDING_THREADS:
+        torch.set_num_threads(settings.EMBEDDING_THREADS)
+    processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME)
+    model = CLIPModel.from_pretrained(CLIP_MODEL_NAME)
+    model.eval()
+    return processor, model
+
+
+def load_embedding_image(image_file):
+    """
+    Decode an image for CLIP, which only looks at CLIP_IMAGE_SIZE pixels.
+
+    JPEG images are decoded directly at the smallest scale still covering
+    CLIP_IMAGE_SIZE, like optimize_image does.
+
+    Args:
+        image_file: The image file
+
+    Returns:
+        PIL.Image.Image: The decoded RGB image
+    """
+    img = Image.open(image_file)
+    img.draft("RGB", (CLIP_IMAGE_SIZE, CLIP_IMAGE_SIZE))
+    img = ImageOps.exif_transpose(img)
+    return img.convert("RGB")
+
+
+def generate_image_embeddings(images):
+    """
+    Generate the embeddings of a batch of images with a single inference of
+    the CLIP model.
+
+    Args:
+        images: Sequence of PIL images, such as returned by load_embedding_image
+
+    Returns:
+        numpy.ndarray: One normalized 512-dimension embedding per image
+    """
+    import torch
+
+    processor, model = load_clip()
+    inputs = processor(images=list(images), return_tensors="pt")
+    with torch.inference_mode():
+        embeddings = model.get_image_features(**inputs)
+    embeddings = embeddings / torch.linalg.norm(embeddings, dim=-1, keepdim=True)
+    return embeddings.cpu().numpy()
 
-# def generate_image_embedding(image_file, as_list=True):
-#     """
-#     Generate an embedding for an uploaded image using CLIP model.
 
-#     Args:
-#         image_file: An InMemoryUploadedFile or similar file object
-#         as_list: Boolean indicating whether to return the embedding as a list (True) or a NumPy array (False).
+def generate_image_embedding(image_file, as_list=True):
+    """
+    Generate an embedding for an uploaded image using CLIP model.
 
-#     Returns:
-#         list or numpy.ndarray: The image embedding.
-#     """
-#     # Load CLIP model and processor
-#     model_name = "openai/clip-vit-base-patch32"
-#     processor = CLIPProcessor.from_pretrained(model_name)
-#     model = CLIPModel.from_pretrained(model_name)
+    Images processed in bulk should rather go through generate_image_embeddings.
 
-#     # Convert file to PIL Image
-#     image = Image.open(image_file)
+    Args:
+        image_file: An InMemoryUploadedFile or similar file object
+        as_list: Boolean indicating whether to return the embedding as a list (True) or a NumPy array (False).
 
-#     # Prepare input for the model
-#     inputs = processor(text=[""], images=image, return_tensors="pt")
+    Returns:
+        list or numpy.ndarray: The image embedding.
+    """
+    embedding = generate_image_embeddings([load_embedding_image(image_file)])[0]
+    if as_list:
+        return embedding.tolist()
+    else:
+        return embedding
 
-#     # Generate embedding
-#     with torch.no_grad():
-#         outputs = model(**inputs)
-#         image_embedding = outputs.image_embeds
 
-#     # Normalize the embedding
-#     image_embedding_norm = image_embedding / torch.linalg.norm(
-#         image_embedding, dim=-1, keepdim=True
-#     )
-#     if as_list:
-#         return image_embedding_norm[0].tolist()
-#     else:
-#         return image_embedding_norm.cpu().numpy()[0]
+def _save_jpeg(img, quality):
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    img.save(output, format="JPEG", quality=quality, optimize=True)
+    return output
 
 
-def optimize_image(image_field, max_size_kb=500):
+def optimize_image(
+    image_field, max_size_kb=500, max_dimension=2048, min_quality=40, max_quality=85
+):
     """
     Optimize the image to reduce its file size while maintaining quality.
 
+    The image is rotated according to its EXIF orientation, downscaled so that
+    its largest side is at most max_dimension pixels and saved as JPEG with the
+    highest quality that fits in max_size_kb, found by a bounded binary
+    search. If even min_quality does not fit, the image is downscaled further.
+
+    JPEG files are decoded directly at a reduced scale (Pillow's draft mode)
+    and downscaled with Pillow's reduce fast path, so full-resolution phone
+    photos are never fully decoded in memory. The result is written to a
+    spooled temporary file, which only stays in memory while it is small.
+
     Args:
         image_field: The image field from the form
         max_size_kb: Maximum size in kilobytes (default 500KB)
+        max_dimension: Maximum width and height in pixels (default 2048)
+        min_quality: Lowest JPEG quality tried before downscaling further
+        max_quality: Highest JPEG quality tried
 
     Returns:
         Django File object with the optimized image
@@ -63,21 +145,100 @@ def optimize_image(image_field, max_size_kb=500):
         return None
 
     img = Image.open(image_field)
-
-    # Convert to RGB if image is in RGBA mode
-    if img.mode == "RGBA":
+    # Let the JPEG decoder scale the image down by 1/2, 1/4 or 1/8 while decoding
+    scale = max_dimension / max(img.size)
+    if scale < 1:
+        draft_size = (math.ceil(img.width * scale), math.ceil(img.height * scale))
+        img.draft("RGB", draft_size)
+    img = ImageOps.exif_transpose(img)
+
+    # JPEG only supports RGB and grayscale images
+    if img.mode not in ("RGB", "L"):
         img = img.convert("RGB")
 
-    # Initial quality
-    quality = 80
-    max_size_bytes = max_size_kb * 1024
-
-    # Create a BytesIO object to store the optimized image
-    output = BytesIO()
+    img.thumbnail((max_dimension, max_dimension), reducing_gap=3.0)
 
-    # Save the image with the initial quality
-    img.save(output, format="JPEG", quality=quality, optimize=True)
+    max_size_bytes = max_size_kb * 1024
+    best = None
+    for _ in range(MAX_DOWNSCALE_STEPS):
+        # Binary search of the highest quality that fits in the size budget,
+        # starting with the highest one since most images fit right away
+        low, high = min_quality, max_quality
+        middle = max_quality
+        while low <= high:
+            output = _save_jpeg(img, middle)
+            if output.tell() <= max_size_bytes:
+                if best:
+                    best.close()
+                best = output
+                low = middle + 1
+            else:
+                output.close()
+                high = middle - 1
+            middle = (low + high) // 2
+        if best:
+            break
+        img = img.resize(
+            (max(1, int(img.width * 0.75)), max(1, int(img.height * 0.75))),
+            Image.Resampling.LANCZOS,
+        )
+    else:
+        best = _save_jpeg(img, min_quality)
+    output = best
 
     # Create a new Django file object
     output.seek(0)
-    return File(output, name=image_field.name)
+    name = os.path.splitext(os.path.basename(image_field.name))[0] + ".jpg"
+    return File(output, name=name)
+
+
+def image_variants(image_file):
+    """
+    Generate the responsive variants of an image in every VARIANT_FORMATS format.
+
+    The image is downscaled in place from the largest variant to the smallest
+    one, so each variant is computed from the previous one. Images are never
+    upscaled: a variant at least as large as the image is the same as the
+    next larger one.
+
+    Args:
+        image_file: The image file, usually the output of optimize_image
+
+    Returns:
+        dict: For each name of IMAGE_VARIANTS, a dict with the "width" and
+        "height" of the variant and its "files", a dict of Django File objects
+        by format. Variants of the same size share the same dict.
+    """
+    img = Image.open(image_file)
+    largest = max(IMAGE_VARIANTS.values())
+    img.draft("RGB", (largest, largest))
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    base_name = os.path.splitext(os.path.basename(image_file.name))[0]
+    variants = {}
+    previous = None
+    for name, max_dimension in sorted(
+        IMAGE_VARIANTS.items(), key=lambda item: item[1], reverse=True
+    ):
+        img.thumbnail((max_dimension, max_dimension), reducing_gap=3.0)
+        if previous and previous["width"] == img.width:
+            variants[name] = previous
+            continue
+        files = {}
+        for image_format, (pillow_format, ext) in VARIANT_FORMATS.items():
+            output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            img.save(
+                output, format=pillow_format, quality=VARIANT_QUALITY, optimize=True
+            )
+            output.seek(0)
+            files[image_format] = File(
+                output, name=f"{base_name}_{img.width}w.{ext}"
+            )
+        previous = variants[name] = {
+            "width": img.width,
+            "height": img.height,
+            "files": files,
+        }
+    return variants
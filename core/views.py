@@ -2,26 +2,51 @@
 Views for the core app.
 """
 
+import asyncio
 import json
+import math
+import uuid
 from datetime import datetime
 
 import pytz
+from PIL import UnidentifiedImageError
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.core.files.storage import default_storage
-from django.http import JsonResponse
+from django.db import transaction
+from django.db.models import F, OuterRef, Q
+from django.http import (
+    Http404,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.views.generic.edit import CreateView
 
+from . import cache as hunt_cache
+from . import photo_match
+from . import throttle as location_checks
+from .cache import CATALOG_VERSION_KEY, bump_catalog_version, progress_version_key
+from .chains import get_clue_chain
 from .forms import CustomUserCreationForm
-from .models import Clue, TreasureHunt, UserProgress
-
-# from .utils import generate_image_embedding, optimize_image
-from .utils import optimize_image
+from .geo import haversine_many_m
+from .jobs import enqueue_direct_uploads, enqueue_uploads, presign_uploads
+from .leaderboard import broadcaster
+from .models import Clue, ImageBlob, Job, TreasureHunt, UserProgress, clues_before
+from .ordering import CLUE_ORDER_GAP, sparse_orders
+from .pagination import paginate_hunts
+from .recommendations import recommended_hunts
+from .storage import supports_presigned_uploads
+from .throttle import THROTTLED, TOO_FAR, check_location, check_photo, remember_target
 
 
 def login_view(request):
@@ -81,6 +106,139 @@ def logout_view(request):
     return redirect("login")
 
 
+def _catalog_page(request):
+    """
+    Build the page of the hunt catalog requested by the query string.
+
+    Reads the optional "q" (search terms) and "cursor" (position returned with
+    the previous page) parameters.
+
+    Returns:
+        tuple: (list of annotated hunts, cursor of the next page or None, search terms)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    query = request.GET.get("q", "").strip()
+    cursor = request.GET.get("cursor")
+
+    treasure_hunts = TreasureHunt.objects.visible_to(request.user)
+    if query:
+        treasure_hunts = treasure_hunts.search(query)
+    treasure_hunts = treasure_hunts.with_progress(request.user)
+
+    hunts, next_cursor = paginate_hunts(treasure_hunts, cursor)
+    return hunts, next_cursor, query
+
+
+def _progress_summary(user, progress_version):
+    """
+    Return the cached summary of the user's progress in every hunt.
+
+    Returns:
+        dict: (is_completed, total_points, current_clue_order) by hunt id
+    """
+    key = f"progress:{user.id}:{progress_version}:summary"
+    found = hunt_cache.get_many("progress", [key])
+    if key in found:
+        return found[key]
+
+    summary = {
+        str(hunt_id): (is_completed, total_points, current_clue_order or 0)
+        for hunt_id, is_completed, total_points, current_clue_order in (
+            UserProgress.objects.filter(user=user).values_list(
+                "treasure_hunt_id", "is_completed", "total_points", "current_clue__order"
+            )
+        )
+    }
+    hunt_cache.set_many({key: summary})
+    return summary
+
+
+def _cached_hunt_cards(request):
+    """
+    Return the rendered hunt cards of the requested catalog page.
+
+    The page (ids of its hunts and the next cursor), the user's progress
+    summary and every rendered card are cached under the current catalog and
+    progress versions. Cards are keyed by everything they display, so users in
+    the same situation regarding a hunt share the same cached card. When every
+    entry is cached, the page is served without any catalog query.
+
+    Returns:
+        tuple: (list of rendered cards, cursor of the next page or None, search terms)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    user = request.user
+    query = request.GET.get("q", "").strip()
+    cursor = request.GET.get("cursor")
+
+    catalog_version, progress_version = hunt_cache.get_versions(
+        CATALOG_VERSION_KEY, progress_version_key(user.id)
+    )
+    summary = _progress_summary(user, progress_version)
+
+    page_key = f"catalog:page:{catalog_version}:{user.id}:{hunt_cache.digest(query, cursor)}"
+    page = hunt_cache.get_many("pages", [page_key]).get(page_key)
+    hunts = {}
+    if page is None:
+        treasure_hunts, next_cursor, query = _catalog_page(request)
+        hunts = {str(hunt.id): hunt for hunt in treasure_hunts}
+        page = {
+            "entries": [
+                (str(hunt.id), hunt.creator_id, hunt.end_date)
+                for hunt in treasure_hunts
+            ],
+            "next_cursor": next_cursor,
+        }
+        hunt_cache.set_many({page_key: page})
+
+    now = timezone.now()
+    card_keys = []
+    for hunt_id, creator_id, end_date in page["entries"]:
+        state = (
+            creator_id == user.id,
+            bool(end_date and end_date < now),
+            summary.get(hunt_id),
+        )
+        card_keys.append(
+            f"catalog:card:{catalog_version}:{hunt_id}:{hunt_cache.digest(*state)}"
+        )
+
+    cards = hunt_cache.get_many("cards", card_keys)
+    missing_ids = [
+        entry[0]
+        for entry, key in zip(page["entries"], card_keys)
+        if key not in cards and entry[0] not in hunts
+    ]
+    if missing_ids:
+        hunts.update(
+            (str(hunt.id), hunt)
+            for hunt in TreasureHunt.objects.filter(id__in=missing_ids).with_progress(
+                user
+            )
+        )
+
+    new_cards = {}
+    for entry, key in zip(page["entries"], card_keys):
+        hunt = hunts.get(entry[0])
+        if key not in cards and hunt is not None:
+            new_cards[key] = render_to_string(
+                "core/components/hunt_card.html",
+                {"hunt": hunt, "is_creator": hunt.creator_id == user.id},
+            )
+    hunt_cache.set_many(new_cards)
+    cards.update(new_cards)
+
+    return (
+        [mark_safe(cards[key]) for key in card_keys if key in cards],
+        page["next_cursor"],
+        query,
+    )
+
+
 @login_required
 def treasure_hunt_list(request):
     """
@@ -90,80 +248,148 @@ def treasure_hunt_list(request):
     For each hunt, displays progress information including completion status,
     points earned, and percentage completed.
 
+    The catalog is built from a single annotated queryset (see
+    TreasureHuntQuerySet.with_progress) and paginated by keyset on
+    (created_at, id), so rendering a page costs one query for the hunts on top
+    of the session and user lookups, no matter how many hunts exist. The
+    rendered cards are cached (see _cached_hunt_cards), so repeated visits
+    usually skip that query and the rendering altogether.
+
     Args:
         request: The HTTP request object
 
     Returns:
         Rendered template with list of treasure hunts and their associated progress data
     """
-    treasure_hunts = TreasureHunt.objects.all()
-    treasure_hunts = treasure_hunts.filter(is_public=True) | treasure_hunts.filter(
-        creator=request.user
-    )
+    try:
+        hunt_cards, next_cursor, query = _cached_hunt_cards(request)
+    except ValueError:
+        messages.error(request, "Invalid page requested")
+        return redirect("treasure_hunt_list")
 
-    user_progress = {
-        progress.treasure_hunt_id: {
-            "is_completed": progress.is_completed,
-            "total_points": progress.total_points,
-            "current_clue_order": (
-                progress.current_clue.order if progress.current_clue else 0
-            ),
-            "total_clues": progress.treasure_hunt.clues.count(),
-        }
-        for progress in UserProgress.objects.filter(user=request.user).select_related(
-            "current_clue", "treasure_hunt"
-        )
+    context = {
+        "hunt_cards": hunt_cards,
+        "next_cursor": next_cursor,
+        "query": query,
+        "user": request.user,
     }
+    return render(request, "core/treasure_hunt_list.html", context)
 
-    hunts_data = []
-    for hunt in treasure_hunts:
-        progress_data = user_progress.get(
-            hunt.id,
-            {
-                "is_completed": False,
-                "total_points": 0,
-                "current_clue_order": 0,
-                "total_clues": hunt.clues.count(),
-            },
-        )
 
-        # Calculate the progress percentage
-        progress_percentage = (
-            (
-                progress_data["total_points"]
-                / (progress_data["total_clues"] * hunt.points_per_clue)
-            )
-            * 100
-            if progress_data["total_clues"] > 0
-            else 0
+@login_required
+def nearby_hunts(request):
+    """
+    View function returning, as JSON, the hunts that start near a location.
+
+    Expects "lat" and "lng" query parameters, and optionally "radius" in
+    meters (default NEARBY_HUNTS_DEFAULT_RADIUS). Candidates are found through
+    the geohash index on the start location of the hunts, then filtered and
+    sorted by their exact distance.
+    """
+    try:
+        lat = float(request.GET["lat"])
+        lng = float(request.GET["lng"])
+        radius = float(
+            request.GET.get("radius", settings.NEARBY_HUNTS_DEFAULT_RADIUS)
         )
-        if progress_data["is_completed"]:
-            progress_percentage = 100
-        elif progress_data["total_clues"] > 0:
-            # Subtract 1 from current_clue_order because the order starts at 1
-            current = max(0, progress_data["current_clue_order"] - 1)
-            progress_percentage = (current / progress_data["total_clues"]) * 100
-        else:
-            progress_percentage = 0
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180 and radius > 0):
+            raise ValueError("Invalid location")
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Invalid location data"}, status=400)
+    radius = min(radius, settings.NEARBY_HUNTS_MAX_RADIUS)
 
-        # Check if hunt has expired
-        is_expired = hunt.end_date and hunt.end_date < timezone.now()
+    candidates = list(
+        TreasureHunt.objects.visible_to(request.user)
+        .near(lat, lng, radius)
+        .select_related("creator")
+    )
+    if not candidates:
+        return JsonResponse({"results": []})
+
+    distances = haversine_many_m(
+        lat,
+        lng,
+        [hunt.start_latitude for hunt in candidates],
+        [hunt.start_longitude for hunt in candidates],
+    )
+    nearby = sorted(
+        (
+            (float(distance), hunt)
+            for distance, hunt in zip(distances, candidates)
+            if distance <= radius
+        ),
+        key=lambda item: item[0],
+    )[: settings.HUNT_CATALOG_PAGE_SIZE]
+
+    results = [
+        {
+            "id": str(hunt.id),
+            "title": hunt.title,
+            "description": hunt.description,
+            "image_url": hunt.image.url if hunt.image else None,
+            "creator": hunt.creator.username,
+            "is_public": hunt.is_public,
+            "distance": round(distance),
+            "details_url": reverse("hunt_details", args=[hunt.id]),
+        }
+        for distance, hunt in nearby
+    ]
+    return JsonResponse({"results": results})
 
-        hunts_data.append(
-            {
-                "hunt": hunt,
-                "is_completed": progress_data["is_completed"],
-                "total_points": progress_data["total_points"],
-                "progress_percentage": progress_percentage,
-                "is_expired": is_expired,
-            }
-        )
 
-    context = {
-        "treasure_hunts": hunts_data,
-        "user": request.user,
-    }
-    return render(request, "core/treasure_hunt_list.html", context)
+@staff_member_required
+def cache_stats(request):
+    """
+    View function returning the hit/miss counters of the hunt catalog cache.
+
+    Counters are kept per process and reset when the worker restarts.
+    """
+    return JsonResponse(hunt_cache.stats.snapshot())
+
+
+@staff_member_required
+def location_check_stats(request):
+    """
+    View function returning the counters of evaluated and rejected location checks.
+
+    Counters are kept per process and reset when the worker restarts.
+    """
+    return JsonResponse(location_checks.stats.snapshot())
+
+
+@login_required
+def treasure_hunt_list_json(request):
+    """
+    View function returning a page of the treasure hunt list as JSON.
+
+    Accepts the same "q" and "cursor" parameters as treasure_hunt_list, so
+    mobile clients can scroll through the catalog page by page.
+    """
+    try:
+        treasure_hunts, next_cursor, query = _catalog_page(request)
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    results = [
+        {
+            "id": str(hunt.id),
+            "title": hunt.title,
+            "description": hunt.description,
+            "image_url": hunt.image.url if hunt.image else None,
+            "creator": hunt.creator.username,
+            "created_at": hunt.created_at.isoformat(),
+            "end_date": hunt.end_date.isoformat() if hunt.end_date else None,
+            "is_public": hunt.is_public,
+            "is_expired": hunt.is_expired,
+            "is_completed": hunt.is_completed,
+            "total_clues": hunt.total_clues,
+            "total_points": hunt.total_points,
+            "progress_percentage": hunt.progress_percentage,
+            "details_url": reverse("hunt_details", args=[hunt.id]),
+        }
+        for hunt in treasure_hunts
+    ]
+    return JsonResponse({"results": results, "next_cursor": next_cursor, "q": query})
 
 
 @login_required
@@ -196,14 +422,89 @@ def view_hunt(request, hunt_id):
         messages.error(request, "You must enroll in the hunt before you can start it.")
         return redirect("hunt_details", hunt_id=hunt_id)
 
+    current_clue = user_progress.current_clue
+    # The number of the clue is its position in the cached clue chain
+    user_progress.treasure_hunt = treasure_hunt
+    _, position = _progress_chain(user_progress)
     context = {
         "treasure_hunt": treasure_hunt,
         "progress": user_progress,
-        "current_clue": user_progress.current_clue,
+        "current_clue": current_clue,
+        "current_clue_number": position + 1,
+        # Clues with an embedded reference image can be solved with a photo
+        "photo_verification": settings.PHOTO_VERIFICATION_ENABLED
+        and current_clue.image_embedding is not None,
     }
     return render(request, "core/view_hunt.html", context)
 
 
+def _throttled_response(check):
+    """
+    Return the response sent when a user checks their location too often.
+    """
+    response = JsonResponse(
+        {
+            "success": False,
+            "message": "Too many location checks. Please wait a moment and try again.",
+        },
+        status=429,
+    )
+    response["Retry-After"] = str(math.ceil(check.retry_after))
+    return response
+
+
+def _progress_chain(progress):
+    """
+    Return the clue chain of the progress' hunt and the position of its current clue.
+
+    The chain comes from the in-process cache (see core.chains), so no clue is
+    queried unless the hunt's clues changed since the chain was built.
+    """
+    chain = get_clue_chain(progress.treasure_hunt)
+    position = chain.position(progress.current_clue_id)
+    if position is None:
+        # The clues changed while the chain was being built, rebuild it
+        chain = get_clue_chain(progress.treasure_hunt, refresh=True)
+        position = chain.position(progress.current_clue_id)
+    return chain, position
+
+
+def _solve_current_clue(progress, chain, position):
+    """
+    Move the progress past its current clue and return the response telling
+    the user what comes next.
+    """
+    hunt_id = progress.treasure_hunt_id
+    next_clue_id = chain.next_id(position)
+
+    # Award points and move to the next clue, unless a concurrent request
+    # for the same clue already did
+    if not progress.advance_from(progress.current_clue_id, next_clue_id):
+        return JsonResponse(
+            {
+                "success": False,
+                "message": "This clue has already been solved. Reload the page to see your current clue.",
+            }
+        )
+
+    if next_clue_id:
+        return JsonResponse(
+            {
+                "success": True,
+                "message": chain.unlock_messages[position],
+                "next_clue": True,
+            }
+        )
+    return JsonResponse(
+        {
+            "success": True,
+            "message": chain.unlock_messages[position],
+            "completed": True,
+            "completion_url": reverse("hunt_completion", args=[hunt_id]),
+        }
+    )
+
+
 @login_required
 def verify_location(request, hunt_id):
     """
@@ -219,52 +520,41 @@ def verify_location(request, hunt_id):
     except (json.JSONDecodeError, ValueError):
         return JsonResponse({"error": "Invalid location data"}, status=400)
 
-    # Get the user's progress
+    # Reject throttled requests and fixes far from the last known clue location
+    # without touching the database
+    check = check_location(request.user.id, hunt_id, [user_lat], [user_lng])
+    if check.action == THROTTLED:
+        return _throttled_response(check)
+    if check.action == TOO_FAR:
+        return JsonResponse(
+            {
+                "success": False,
+                "message": "You're not close enough to the clue location. Keep searching!",
+            }
+        )
+
+    # Get the user's progress along with its hunt in one query
     progress = get_object_or_404(
-        UserProgress, user=request.user, treasure_hunt_id=hunt_id
+        UserProgress.objects.select_related("treasure_hunt"),
+        user=request.user,
+        treasure_hunt_id=hunt_id,
     )
-    current_clue = progress.current_clue
+    if progress.is_completed:
+        return JsonResponse(
+            {
+                "success": True,
+                "message": progress.treasure_hunt.completion_message,
+                "completed": True,
+                "completion_url": reverse("hunt_completion", args=[hunt_id]),
+            }
+        )
+    chain, position = _progress_chain(progress)
 
-    # Verify if the coordinates match (with a margin of error of 10 meters)
-    margin = 0.0001  # Approximately 10 meters
-    if (
-        abs(current_clue.latitude - user_lat) <= margin
-        and abs(current_clue.longitude - user_lng) <= margin
-    ):
-        # Get the next clue
-        next_clue = progress.treasure_hunt.clues.filter(
-            order__gt=current_clue.order
-        ).first()
-
-        # Award points for completing the current clue
-        progress.total_points += progress.treasure_hunt.points_per_clue
-
-        if next_clue:
-            # Update the user to the next clue
-            progress.current_clue = next_clue
-            progress.save()
-            return JsonResponse(
-                {
-                    "success": True,
-                    "message": current_clue.unlock_message,
-                    "next_clue": True,
-                }
-            )
-        else:
-            # This was the last clue - mark as completed
-            progress.is_completed = True
-            progress.completed_at = timezone.now()
-            progress.total_points += progress.treasure_hunt.completion_points
-            progress.save()
-            return JsonResponse(
-                {
-                    "success": True,
-                    "message": current_clue.unlock_message,
-                    "completed": True,
-                    "completion_url": reverse("hunt_completion", args=[hunt_id]),
-                }
-            )
+    # Verify if the user is within the radius of the clue
+    if chain.is_solved_by(position, user_lat, user_lng):
+        return _solve_current_clue(progress, chain, position)
 
+    remember_target(request.user.id, hunt_id, check, *chain.target(position))
     return JsonResponse(
         {
             "success": False,
@@ -273,6 +563,279 @@ def verify_location(request, hunt_id):
     )
 
 
+@login_required
+def verify_trail(request, hunt_id):
+    """
+    View function for verifying a batch of buffered GPS fixes against a treasure hunt's clues.
+
+    Expects a JSON body like {"fixes": [{"latitude": ..., "longitude": ...,
+    "timestamp": ...}, ...]}. The fixes are evaluated in chronological order
+    against the current clue and the ones after it, so a single request can
+    solve several clues and clients only need to sync every few seconds.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        fixes = json.loads(request.body).get("fixes")
+        if not isinstance(fixes, list) or not (
+            0 < len(fixes) <= settings.MAX_TRAIL_FIXES
+        ):
+            raise ValueError("Invalid number of fixes")
+        fixes = sorted(fixes, key=lambda fix: float(fix.get("timestamp", 0)))
+        lats = [float(fix["latitude"]) for fix in fixes]
+        lngs = [float(fix["longitude"]) for fix in fixes]
+    except (json.JSONDecodeError, AttributeError, KeyError, TypeError, ValueError):
+        return JsonResponse({"error": "Invalid location data"}, status=400)
+
+    # Reject throttled requests and trails far from the last known clue location
+    # without touching the database
+    check = check_location(request.user.id, hunt_id, lats, lngs)
+    if check.action == THROTTLED:
+        return _throttled_response(check)
+    if check.action == TOO_FAR:
+        return JsonResponse(
+            {
+                "success": False,
+                "solved": 0,
+                "message": "You're not close enough to the clue location. Keep searching!",
+            }
+        )
+
+    # Get the user's progress along with its hunt in one query
+    progress = get_object_or_404(
+        UserProgress.objects.select_related("treasure_hunt"),
+        user=request.user,
+        treasure_hunt_id=hunt_id,
+    )
+    if progress.is_completed:
+        return JsonResponse(
+            {
+                "success": True,
+                "message": progress.treasure_hunt.completion_message,
+                "completed": True,
+                "completion_url": reverse("hunt_completion", args=[hunt_id]),
+            }
+        )
+    chain, position = _progress_chain(progress)
+
+    # Evaluate the fixes against the current clue and all the ones after it
+    solved = chain.count_solved(position, lats, lngs)
+    if not solved:
+        remember_target(request.user.id, hunt_id, check, *chain.target(position))
+        return JsonResponse(
+            {
+                "success": False,
+                "solved": 0,
+                "message": "You're not close enough to the clue location. Keep searching!",
+            }
+        )
+
+    next_clue_id = chain.next_id(position + solved - 1)
+    if not progress.advance_from(progress.current_clue_id, next_clue_id, solved):
+        return JsonResponse(
+            {
+                "success": False,
+                "solved": 0,
+                "message": "This clue has already been solved. Reload the page to see your current clue.",
+            }
+        )
+
+    response = {
+        "success": True,
+        "solved": solved,
+        "message": chain.unlock_messages[position + solved - 1],
+        "messages": list(chain.unlock_messages[position : position + solved]),
+    }
+    if next_clue_id:
+        response["next_clue"] = True
+    else:
+        response["completed"] = True
+        response["completion_url"] = reverse("hunt_completion", args=[hunt_id])
+    return JsonResponse(response)
+
+
+@login_required
+def verify_photo(request, hunt_id):
+    """
+    View function for verifying a photo taken by the user against the reference
+    image of their current clue (see core.photo_match).
+
+    Expects a multipart body with the photo in the "photo" field.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    if not settings.PHOTO_VERIFICATION_ENABLED:
+        return JsonResponse(
+            {"error": "Photo verification is not available"}, status=404
+        )
+    photo = request.FILES.get("photo")
+    if not photo:
+        return JsonResponse({"error": "No photo provided"}, status=400)
+
+    check = check_photo(request.user.id, hunt_id)
+    if check.action == THROTTLED:
+        return _throttled_response(check)
+
+    progress = get_object_or_404(
+        UserProgress.objects.select_related("treasure_hunt", "current_clue"),
+        user=request.user,
+        treasure_hunt_id=hunt_id,
+    )
+    if progress.is_completed:
+        return JsonResponse(
+            {
+                "success": True,
+                "message": progress.treasure_hunt.completion_message,
+                "completed": True,
+                "completion_url": reverse("hunt_completion", args=[hunt_id]),
+            }
+        )
+    clue = progress.current_clue
+    if clue.image_embedding is None:
+        return JsonResponse(
+            {
+                "success": False,
+                "message": "This clue can only be solved at its location.",
+            }
+        )
+
+    try:
+        embedding = photo_match.photo_embedding(photo)
+    except (UnidentifiedImageError, OSError):
+        return JsonResponse({"error": "Invalid image"}, status=400)
+
+    if photo_match.is_match(photo_match.similarity(embedding, clue.image_embedding)):
+        chain, position = _progress_chain(progress)
+        return _solve_current_clue(progress, chain, position)
+
+    # Tell the user when the photo shows the place of a clue already solved
+    closest = photo_match.closest_clues(embedding, hunt_id)
+    if (
+        closest
+        and closest[0].order < clue.order
+        and photo_match.is_match(closest[0].similarity)
+    ):
+        message = "This looks like the place of a clue you have already solved."
+    else:
+        message = "This photo doesn't match the clue's reference image. Keep searching!"
+    return JsonResponse({"success": False, "message": message})
+
+
+def _clue_fields(post, index, default_radius=15):
+    """
+    Read and validate the fields of a clue submitted with the hunt forms.
+
+    Raises a ValueError naming the clue if a field is missing or invalid, so
+    that a hunt is never saved with only part of its clues.
+    """
+    prefix = f"clues[{index}]"
+    try:
+        latitude = float(post.get(f"{prefix}[latitude]"))
+        longitude = float(post.get(f"{prefix}[longitude]"))
+        radius = int(post.get(f"{prefix}[radius]", default_radius))
+    except (TypeError, ValueError):
+        raise ValueError(f"Clue {index + 1} has an invalid location or radius")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and radius >= 0):
+        raise ValueError(f"Clue {index + 1} has an invalid location or radius")
+
+    fields = {
+        "hint_text": post.get(f"{prefix}[hint_text]"),
+        "latitude": latitude,
+        "longitude": longitude,
+        "radius": radius,
+    }
+    unlock_message = post.get(f"{prefix}[unlock_message]")
+    if unlock_message is not None:
+        fields["unlock_message"] = unlock_message
+    return fields
+
+
+def _hunt_saved_response(hunt, clue_ids, changes=None):
+    """
+    Return the response of a successful creation or edition of a hunt.
+
+    Along with the page to go to, it tells the browser the ids of the clues,
+    in the order of the form, where to upload their images directly and, for
+    an edition, how many clues were created, updated and deleted.
+    """
+    response = {
+        "success": True,
+        "redirect_url": reverse("hunt_details", kwargs={"hunt_id": hunt.id}),
+        "clue_ids": clue_ids,
+        "uploads_url": reverse("hunt_uploads", args=[hunt.id]),
+        "finalize_uploads_url": reverse("finalize_hunt_uploads", args=[hunt.id]),
+    }
+    if changes is not None:
+        response["changes"] = changes
+    return JsonResponse(response)
+
+
+@login_required
+def hunt_uploads(request, hunt_id):
+    """
+    View function issuing presigned forms to upload images of a hunt directly to S3.
+
+    Expects a JSON body like {"files": [{"clue_id": ..., "filename": ...,
+    "content_type": ...}, ...]}, with a null clue_id for the main image of
+    the hunt. Returns the forms in the same order.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    hunt = get_object_or_404(TreasureHunt, pk=hunt_id)
+    if hunt.creator != request.user:
+        return HttpResponseForbidden()
+    if not supports_presigned_uploads():
+        return JsonResponse(
+            {"error": "The storage does not support direct uploads"}, status=400
+        )
+
+    clues = {str(clue.id): clue for clue in hunt.clues.all()}
+    try:
+        files = json.loads(request.body)["files"]
+        if not isinstance(files, list) or len(files) > len(clues) + 1:
+            raise ValueError("Invalid number of files")
+        files = [
+            (
+                clues[file["clue_id"]] if file["clue_id"] else None,
+                str(file["filename"]),
+                str(file["content_type"]),
+            )
+            for file in files
+        ]
+        if not all(content_type.startswith("image/") for _, _, content_type in files):
+            raise ValueError("Only images can be uploaded")
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return JsonResponse({"error": "Invalid upload data"}, status=400)
+
+    return JsonResponse({"uploads": presign_uploads(hunt, files)})
+
+
+@login_required
+def finalize_hunt_uploads(request, hunt_id):
+    """
+    View function queuing the processing of the images uploaded directly to S3.
+
+    Expects a JSON body like {"tokens": [...]}, with the tokens returned by
+    hunt_uploads for the images whose upload succeeded.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    hunt = get_object_or_404(TreasureHunt, pk=hunt_id)
+    if hunt.creator != request.user:
+        return HttpResponseForbidden()
+
+    try:
+        tokens = json.loads(request.body)["tokens"]
+        if not isinstance(tokens, list):
+            raise ValueError("Invalid tokens")
+        jobs = enqueue_direct_uploads(hunt, tokens)
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+
+    return JsonResponse({"success": True, "jobs": len(jobs)})
+
+
 @login_required
 def create_hunt(request):
     """
@@ -306,75 +869,57 @@ def create_hunt(request):
         else:
             end_date = None
         try:
-            # Create the treasure hunt
-            hunt = TreasureHunt.objects.create(
-                title=request.POST.get("title"),
-                description=request.POST.get("description"),
-                creator=request.user,
-                is_public=request.POST.get("is_public") == "on",
-                points_per_clue=int(request.POST.get("points_per_clue", 10)),
-                completion_points=int(request.POST.get("completion_points", 50)),
-                completion_message=request.POST.get(
-                    "completion_message",
-                    "Congratulations! You have completed the treasure hunt.",
-                ),
-                end_date=end_date,
-            )
-
-            # Handle main image upload
-            main_image = request.FILES.get("image")
-            if main_image:
-                optimized_image = optimize_image(main_image)
-                hunt.image = optimized_image
-                hunt.save()
-
-            # Process clues
+            # Validate all the clues before writing anything
+            clues_fields = []
             clue_count = 0
-            while True:
-                hint_text = request.POST.get(f"clues[{clue_count}][hint_text]")
-                if hint_text is None:
-                    break
-
-                clue = Clue.objects.create(
-                    treasure_hunt=hunt,
-                    hint_text=hint_text,
-                    unlock_message=request.POST.get(
-                        f"clues[{clue_count}][unlock_message]"
-                    ),
-                    latitude=float(request.POST.get(f"clues[{clue_count}][latitude]")),
-                    longitude=float(
-                        request.POST.get(f"clues[{clue_count}][longitude]")
+            while request.POST.get(f"clues[{clue_count}][hint_text]") is not None:
+                clues_fields.append(_clue_fields(request.POST, clue_count))
+                clue_count += 1
+
+            with transaction.atomic():
+                # Create the treasure hunt
+                hunt = TreasureHunt.objects.create(
+                    title=request.POST.get("title"),
+                    description=request.POST.get("description"),
+                    creator=request.user,
+                    is_public=request.POST.get("is_public") == "on",
+                    points_per_clue=int(request.POST.get("points_per_clue", 10)),
+                    completion_points=int(request.POST.get("completion_points", 50)),
+                    completion_message=request.POST.get(
+                        "completion_message",
+                        "Congratulations! You have completed the treasure hunt.",
                     ),
-                    order=clue_count + 1,
+                    end_date=end_date,
                 )
-
-                # Handle image upload
-                reference_image = request.FILES.get(
-                    f"clues[{clue_count}][reference_image]"
+                clues = Clue.objects.bulk_create(
+                    Clue(
+                        treasure_hunt=hunt, order=(index + 1) * CLUE_ORDER_GAP, **fields
+                    )
+                    for index, fields in enumerate(clues_fields)
                 )
-                if reference_image:
-                    optimized_image = optimize_image(reference_image)
-                    clue.reference_image = optimized_image
-                    # Disabled due to high memory load; consider separating into another process
-                    # image_embedding = generate_image_embedding(reference_image)
-                    # clue.image_embedding = image_embedding
-                    clue.save()
+                # bulk_create bypasses the post_save signals of the clues
+                hunt.refresh_start_location()
+                transaction.on_commit(bump_catalog_version)
 
-                clue_count += 1
+            # Images are uploaded together at the end, out of the transaction,
+            # and optimized later by background jobs
+            uploads = []
+            main_image = request.FILES.get("image")
+            if main_image:
+                uploads.append((Job.HUNT_IMAGE, None, main_image))
+            for index, clue in enumerate(clues):
+                reference_image = request.FILES.get(f"clues[{index}][reference_image]")
+                if reference_image:
+                    uploads.append((Job.CLUE_IMAGE, clue, reference_image))
+            enqueue_uploads(hunt, uploads)
 
-            return JsonResponse(
-                {
-                    "success": True,
-                    "redirect_url": reverse(
-                        "hunt_details", kwargs={"hunt_id": hunt.id}
-                    ),
-                }
-            )
+            return _hunt_saved_response(hunt, [str(clue.id) for clue in clues])
 
         except Exception as e:
             return JsonResponse({"success": False, "error": str(e)})
 
-    return render(request, "core/create_hunt.html")
+    context = {"direct_uploads": supports_presigned_uploads()}
+    return render(request, "core/create_hunt.html", context)
 
 
 @login_required
@@ -391,22 +936,8 @@ def delete_hunt(request, hunt_id):
     if request.method == "POST":
         title = hunt.title
 
-        # Delete main hunt image if it exists
-        if hunt.image:
-            try:
-                hunt.image.delete()
-            except Exception as e:
-                print(f"Error deleting hunt main image: {e}")
-
-        # Delete all clue images
-        for clue in hunt.clues.all():
-            if clue.reference_image:
-                try:
-                    clue.reference_image.delete()
-                except Exception as e:
-                    print(f"Error deleting clue image: {e}")
-
-        # Delete the hunt (this will cascade delete clues)
+        # Delete the hunt (this will cascade delete clues), along with the
+        # images of the hunt and of its clues
         hunt.delete()
         messages.success(request, f'The treasure hunt "{title}" has been deleted')
         return JsonResponse({"success": True})
@@ -457,105 +988,169 @@ def edit_hunt(request, hunt_id):
                 "completion_message", hunt.completion_message
             )
 
-            remove_image = request.POST.get("remove_image")
+            # Only save the edited fields, the image may be replaced meanwhile by a job
+            update_fields = [
+                "title",
+                "description",
+                "is_public",
+                "end_date",
+                "completion_message",
+            ]
+            # Images are uploaded together at the end and optimized later
+            # by background jobs
+            uploads = []
+            # Removed images, released together at the end
+            released_blobs = []
+            # Clues whose pending image jobs are cancelled
+            cancelled_clue_ids = []
+            remove_hunt_image = request.POST.get("remove_image") == "on"
             main_image = request.FILES.get("image")
 
-            if remove_image == "on" and hunt.image:
-                hunt.image.delete()
-                hunt.image = None
-            elif main_image:
-                optimized_image = optimize_image(main_image)
-                hunt.image = optimized_image
-
-            hunt.save()
-
-            # Get existing clues to track which ones to delete
-            existing_clues = {str(clue.id): clue for clue in hunt.clues.all()}
-            processed_clue_ids = set()
+            if main_image and not remove_hunt_image:
+                uploads.append((Job.HUNT_IMAGE, None, main_image))
 
-            # Process clues
-            clue_count = 0
-            while True:
-                hint_text = request.POST.get(f"clues[{clue_count}][hint_text]")
-                if hint_text is None:
-                    break
-
-                clue_id = request.POST.get(f"clues[{clue_count}][id]")
-
-                if clue_id and clue_id in existing_clues:
-                    clue = existing_clues[clue_id]
-                    clue.hint_text = hint_text
-                    clue.unlock_message = request.POST.get(
-                        f"clues[{clue_count}][unlock_message]"
-                    )
-                    clue.latitude = float(
-                        request.POST.get(f"clues[{clue_count}][latitude]")
+            with transaction.atomic():
+                # Lock the clues, then the hunt, in the order the image jobs
+                # take them, so that the images released are the ones of the
+                # rows written here even if a job replaced one meanwhile
+                existing_clues = {
+                    str(clue.id): clue for clue in hunt.clues.select_for_update()
+                }
+                if remove_hunt_image:
+                    hunt.image, hunt.image_blob_id = (
+                        TreasureHunt.objects.select_for_update()
+                        .values_list("image", "image_blob")
+                        .get(pk=hunt.pk)
                     )
-                    clue.longitude = float(
-                        request.POST.get(f"clues[{clue_count}][longitude]")
+                    if hunt.image:
+                        released_blobs += hunt.clear_image()
+                        update_fields += ["image", "image_variants", "image_blob"]
+
+                # Validate all the clues before writing anything
+                submitted = []
+                clue_count = 0
+                while request.POST.get(f"clues[{clue_count}][hint_text]") is not None:
+                    clue = existing_clues.get(
+                        request.POST.get(f"clues[{clue_count}][id]")
                     )
-                    clue.order = clue_count + 1
-                    processed_clue_ids.add(clue_id)
-                else:
-                    # Create new clue
-                    clue = Clue.objects.create(
-                        treasure_hunt=hunt,
-                        hint_text=hint_text,
-                        unlock_message=request.POST.get(
-                            f"clues[{clue_count}][unlock_message]"
-                        ),
-                        latitude=float(
-                            request.POST.get(f"clues[{clue_count}][latitude]")
-                        ),
-                        longitude=float(
-                            request.POST.get(f"clues[{clue_count}][longitude]")
-                        ),
-                        order=clue_count + 1,
+                    fields = _clue_fields(
+                        request.POST, clue_count, clue.radius if clue else 15
                     )
+                    submitted.append((clue, fields))
+                    clue_count += 1
 
-                # Handle image upload or removal
-                remove_image = request.POST.get(f"clues[{clue_count}][remove_image]")
-                reference_image = request.FILES.get(
-                    f"clues[{clue_count}][reference_image]"
+                # Only the clues out of sequence get new orders, see core.ordering
+                orders = sparse_orders(
+                    [clue.order if clue else None for clue, _ in submitted]
                 )
+                for (_, fields), order in zip(submitted, orders):
+                    fields["order"] = order
+
+                # Compare the submitted clues with the existing ones, so that
+                # only the changed fields of the changed clues are written
+                clues = []
+                new_clues = []
+                changed_clues = {}
+                changed_fields = set()
+                for index, (clue, fields) in enumerate(submitted):
+                    is_new = clue is None
+                    if is_new:
+                        clue = Clue(treasure_hunt=hunt, **fields)
+                        new_clues.append(clue)
+                    else:
+                        for name, value in fields.items():
+                            if getattr(clue, name) != value:
+                                setattr(clue, name, value)
+                                changed_fields.add(name)
+                                changed_clues[clue.pk] = clue
+                    clues.append(clue)
+
+                    # Handle image upload or removal
+                    remove_image = request.POST.get(f"clues[{index}][remove_image]")
+                    reference_image = request.FILES.get(
+                        f"clues[{index}][reference_image]"
+                    )
 
-                if remove_image == "on" and clue.reference_image:
-                    clue.reference_image.delete()
-                    clue.reference_image = None
-                    clue.image_embedding = None
-                elif reference_image:
-                    optimized_image = optimize_image(reference_image)
-                    clue.reference_image = optimized_image
-                    # Disabled due to high memory load; consider separating into another process
-                    # image_embedding = generate_image_embedding(reference_image)
-                    # clue.image_embedding = image_embedding
-
-                clue.save()
-                clue_count += 1
-
-            # Delete clues that were not processed
-            clues_to_delete = set(existing_clues.keys()) - processed_clue_ids
-            # Before deleting the clues, also delete their associated images
-            for clue_id_str in clues_to_delete:
-                clue_to_delete = existing_clues[clue_id_str]
-                if clue_to_delete.reference_image:
-                    try:
-                        default_storage.delete(clue_to_delete.reference_image.name)
-                        print(
-                            f"Image deleted when removing clue: {clue_to_delete.reference_image.name}"
-                        )
-                    except Exception as e:
-                        print(f"Error deleting image while removing clue: {e}")
-            hunt.clues.filter(id__in=clues_to_delete).delete()
-
-            return JsonResponse(
-                {
-                    "success": True,
-                    "redirect_url": reverse(
-                        "hunt_details", kwargs={"hunt_id": hunt.id}
-                    ),
-                }
+                    if remove_image == "on" and not is_new:
+                        cancelled_clue_ids.append(clue.pk)
+                        if clue.reference_image:
+                            released_blobs += clue.clear_reference_image()
+                            clue.image_embedding = None
+                            changed_fields.update(
+                                [
+                                    "reference_image",
+                                    "reference_image_variants",
+                                    "reference_image_blob",
+                                    "image_embedding",
+                                ]
+                            )
+                            changed_clues[clue.pk] = clue
+                    elif reference_image:
+                        uploads.append((Job.CLUE_IMAGE, clue, reference_image))
+
+                # Delete clues that were not submitted, releasing their images
+                kept_clue_ids = {str(clue.pk) for clue in clues}
+                deleted_clues = [
+                    clue
+                    for clue_id, clue in existing_clues.items()
+                    if clue_id not in kept_clue_ids
+                ]
+                for clue in deleted_clues:
+                    released_blobs += clue.clear_reference_image()
+
+                hunt.save(update_fields=update_fields)
+                # Cancel the pending jobs of the removed images
+                if remove_hunt_image or cancelled_clue_ids:
+                    cancelled = Q(clue_id__in=cancelled_clue_ids)
+                    if remove_hunt_image:
+                        cancelled |= Q(kind=Job.HUNT_IMAGE)
+                    hunt.jobs.filter(cancelled, status=Job.PENDING).delete()
+                if deleted_clues:
+                    deleted_clue_ids = [clue.pk for clue in deleted_clues]
+                    # The rows depending on the clues are deleted first, with
+                    # their signals, so that the clues themselves can be
+                    # deleted in one query without the post_delete signals
+                    # of each clue, which are handled below at once
+                    Job.objects.filter(clue_id__in=deleted_clue_ids).delete()
+                    UserProgress.objects.filter(
+                        current_clue_id__in=deleted_clue_ids
+                    ).delete()
+                    Clue.objects.filter(pk__in=deleted_clue_ids)._raw_delete(
+                        Clue.objects.db
+                    )
+                if changed_clues:
+                    Clue.objects.bulk_update(
+                        changed_clues.values(), sorted(changed_fields)
+                    )
+                Clue.objects.bulk_create(new_clues)
+                if changed_clues or new_clues or deleted_clues:
+                    # bulk_update and bulk_create bypass the post_save signals
+                    # of the clues, like the deletion above
+                    TreasureHunt.objects.filter(pk=hunt.pk).update(
+                        clues_version=F("clues_version") + 1
+                    )
+                    hunt.refresh_start_location()
+                    if "image_embedding" in changed_fields or any(
+                        clue.image_embedding is not None for clue in deleted_clues
+                    ):
+                        TreasureHunt.objects.filter(pk=hunt.pk).refresh_centroids()
+                    transaction.on_commit(bump_catalog_version)
+
+            # Released once the rows no longer reference them
+            ImageBlob.release(released_blobs)
+            enqueue_uploads(hunt, uploads)
+
+            changes = {
+                "created": len(new_clues),
+                "updated": len(changed_clues),
+                "deleted": len(deleted_clues),
+            }
+            messages.success(
+                request,
+                f"Treasure hunt saved: {changes['created']} clues added, "
+                f"{changes['updated']} changed and {changes['deleted']} deleted",
             )
+            return _hunt_saved_response(hunt, [str(clue.id) for clue in clues], changes)
 
         except Exception as e:
             return JsonResponse({"success": False, "error": str(e)})
@@ -569,15 +1164,85 @@ def edit_hunt(request, hunt_id):
             "unlock_message": clue.unlock_message,
             "latitude": clue.latitude,
             "longitude": clue.longitude,
+            "radius": clue.radius,
         }
         if clue.reference_image:
-            clue_data["reference_image"] = clue.reference_image.url
+            thumbnail = clue.reference_image_variants.get("thumbnail")
+            clue_data["reference_image"] = (
+                default_storage.url(thumbnail["jpeg"])
+                if thumbnail
+                else clue.reference_image.url
+            )
         clues_data.append(clue_data)
 
-    context = {"treasure_hunt": hunt, "clues_json": json.dumps(clues_data)}
+    context = {
+        "treasure_hunt": hunt,
+        "clues_json": json.dumps(clues_data),
+        "direct_uploads": supports_presigned_uploads(),
+    }
     return render(request, "core/edit_hunt.html", context)
 
 
+def _unfinished_jobs(hunt):
+    """
+    Return the status of the image jobs of a hunt that are not done yet.
+    """
+    jobs = hunt.jobs.exclude(status=Job.DONE).annotate(
+        clue_number=clues_before(hunt, OuterRef("clue__order")) + 1
+    )
+    return [
+        {
+            "kind": job.get_kind_display(),
+            "clue_number": job.clue_number if job.clue_id else None,
+            "status": job.status,
+            "error": job.error,
+        }
+        for job in jobs
+    ]
+
+
+@login_required
+def hunt_jobs(request, hunt_id):
+    """
+    View function returning the status of the image jobs of a hunt to its creator.
+    """
+    hunt = get_object_or_404(TreasureHunt, pk=hunt_id)
+    if hunt.creator != request.user:
+        return HttpResponseForbidden()
+    return JsonResponse({"jobs": _unfinished_jobs(hunt)})
+
+
+@login_required
+def reorder_clue(request, clue_id):
+    """
+    View function moving a clue of a hunt right after another one, for its creator.
+
+    Expects a JSON body like {"after": clue_id}, with a null clue_id to move
+    the clue first. Only the order of the moved clue is written (see
+    Clue.move_after), so moving a clue costs the same in any hunt.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    clue = get_object_or_404(Clue.objects.select_related("treasure_hunt"), pk=clue_id)
+    if clue.treasure_hunt.creator != request.user:
+        return HttpResponseForbidden()
+
+    try:
+        after_id = json.loads(request.body)["after"]
+        previous = None
+        if after_id:
+            previous = Clue.objects.get(
+                pk=uuid.UUID(str(after_id)), treasure_hunt_id=clue.treasure_hunt_id
+            )
+            if previous.pk == clue.pk:
+                raise ValueError("A clue cannot be moved after itself")
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError, Clue.DoesNotExist):
+        return JsonResponse({"error": "Invalid clue"}, status=400)
+
+    moved = clue.move_after(previous)
+    return JsonResponse({"success": True, "moved": moved, "order": clue.order})
+
+
 @login_required
 def hunt_details(request, hunt_id):
     """
@@ -606,19 +1271,25 @@ def hunt_details(request, hunt_id):
     if user_progress and total_clues > 0:
         if user_progress.is_completed:
             progress_percentage = 100
-        elif user_progress.current_clue:
-            # Subtract 1 from order since it starts at 1
-            current = max(0, user_progress.current_clue.order - 1)
-            progress_percentage = (current / total_clues) * 100
+        else:
+            # The clues solved are the ones before the current clue in the chain
+            user_progress.treasure_hunt = treasure_hunt
+            _, solved = _progress_chain(user_progress)
+            progress_percentage = (solved / total_clues) * 100
 
+    is_creator = treasure_hunt.creator == request.user
+    image_jobs = _unfinished_jobs(treasure_hunt) if is_creator else []
     context = {
         "treasure_hunt": treasure_hunt,
         "user_progress": user_progress,
         "is_expired": is_expired,
         "total_clues": total_clues,
         "total_possible_points": total_possible_points,
-        "is_creator": treasure_hunt.creator == request.user,
+        "is_creator": is_creator,
         "progress_percentage": progress_percentage,
+        "image_jobs": image_jobs,
+        "image_jobs_pending": any(job["status"] != Job.FAILED for job in image_jobs),
+        "similar_hunts": recommended_hunts(treasure_hunt, request.user),
     }
     return render(request, "core/hunt_details.html", context)
 
@@ -680,7 +1351,13 @@ def view_hunt_participants(request, hunt_id):
     # Get all participants with their progress
     participants = (
         UserProgress.objects.filter(treasure_hunt=treasure_hunt)
-        .select_related("user")
+        .select_related("user", "current_clue")
+        .annotate(
+            current_clue_number=clues_before(
+                treasure_hunt, OuterRef("current_clue__order")
+            )
+            + 1
+        )
         .order_by("-total_points", "started_at")
     )
 
@@ -691,6 +1368,53 @@ def view_hunt_participants(request, hunt_id):
     return render(request, "core/hunt_participants.html", context)
 
 
+@login_required
+async def hunt_leaderboard_stream(request, hunt_id):
+    """
+    View function streaming the leaderboard of a treasure hunt as server-sent events.
+
+    Only accessible by the hunt creator. The current ranking is sent on
+    connection and a new one every time it changes. All the spectators of the
+    process share a single database subscription (see core.leaderboard).
+    """
+    user = await request.auser()
+    treasure_hunt = await TreasureHunt.objects.filter(pk=hunt_id).only(
+        "id", "creator_id"
+    ).afirst()
+    if treasure_hunt is None:
+        raise Http404("Treasure hunt not found")
+    if treasure_hunt.creator_id != user.id:
+        return HttpResponseForbidden(
+            "Only the creator can see the participants of the treasure hunt"
+        )
+
+    queue, current_event = await broadcaster.subscribe(hunt_id)
+
+    async def events():
+        try:
+            yield current_event
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), timeout=settings.LEADERBOARD_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    # Comment line keeping the connection open through proxies
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    # The subscription was lost, the browser will reconnect
+                    return
+                yield event
+        finally:
+            broadcaster.unsubscribe(hunt_id, queue)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @login_required
 def hunt_completion(request, hunt_id):
     """
@@ -721,5 +1445,6 @@ def hunt_completion(request, hunt_id):
         "time_taken": time_taken_str,
         "total_clues": treasure_hunt.clues.count(),
         "total_points": progress.total_points,
+        "similar_hunts": recommended_hunts(treasure_hunt, request.user),
     }
     return render(request, "core/hunt_completion.html", context)
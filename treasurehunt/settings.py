@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "core",
     "storages",
 ]
@@ -77,6 +78,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "treasurehunt.wsgi.application"
+ASGI_APPLICATION = "treasurehunt.asgi.application"
 
 
 # Database
@@ -97,6 +99,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "hunts": {
+        "BACKEND": os.getenv(
+            "HUNT_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("HUNT_CACHE_LOCATION", "hunts"),
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -133,7 +151,7 @@ USE_TZ = True
 
 STORAGES = {
     "default": {
-        "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+        "BACKEND": "core.storage.URLCachingS3Storage",
     },
     "staticfiles": {
         "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
@@ -144,6 +162,19 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME")
+# S3-compatible server used instead of AWS, e.g. a local MinIO
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL")
+# Maximum number of files uploaded to the storage at the same time
+STORAGE_MAX_WORKERS = int(os.getenv("STORAGE_MAX_WORKERS", "8"))
+# Maximum size in bytes of the images uploaded directly to the storage
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+# Seconds during which a direct upload can be sent and then finalized
+UPLOAD_URL_EXPIRE = 900
+# Seconds a signed media URL is reused, capped so that it stays valid for at
+# least HUNT_CACHE_TIMEOUT seconds of its AWS_QUERYSTRING_EXPIRE (3600 by default)
+MEDIA_URL_CACHE_TIMEOUT = int(os.getenv("MEDIA_URL_CACHE_TIMEOUT", "1800"))
+# Maximum number of media URLs cached per process
+MEDIA_URL_CACHE_SIZE = int(os.getenv("MEDIA_URL_CACHE_SIZE", "20000"))
 
 STATIC_URL = f"https://{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com/static/"
 
@@ -156,3 +187,75 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "treasure_hunt_list"
 LOGOUT_REDIRECT_URL = "login"
+
+# Hunt catalog configuration
+HUNT_CATALOG_PAGE_SIZE = int(os.getenv("HUNT_CATALOG_PAGE_SIZE", "24"))
+# Radius in meters of the "hunts near me" search
+NEARBY_HUNTS_DEFAULT_RADIUS = 5000
+NEARBY_HUNTS_MAX_RADIUS = 50000
+HUNT_CACHE_ALIAS = "hunts"
+# Keep below AWS_QUERYSTRING_EXPIRE (3600 by default) so that cached cards
+# never embed an expired signed image URL
+HUNT_CACHE_TIMEOUT = int(os.getenv("HUNT_CACHE_TIMEOUT", "600"))
+# Keep the cache versions in the database when the hunt cache is local to
+# each process, so that every process sees the changes made by the others
+HUNT_CACHE_DATABASE_VERSIONS = (
+    os.getenv("HUNT_CACHE_DATABASE_VERSIONS", "False") == "True"
+)
+
+# Location verification configuration
+MAX_TRAIL_FIXES = int(os.getenv("MAX_TRAIL_FIXES", "500"))
+# Token bucket limiting the location checks of a user in a hunt
+LOCATION_CHECK_RATE = float(os.getenv("LOCATION_CHECK_RATE", "1"))
+LOCATION_CHECK_BURST = int(os.getenv("LOCATION_CHECK_BURST", "5"))
+# Token bucket limiting the photo checks, which run the embedding model
+PHOTO_CHECK_RATE = float(os.getenv("PHOTO_CHECK_RATE", "0.2"))
+PHOTO_CHECK_BURST = int(os.getenv("PHOTO_CHECK_BURST", "3"))
+# Minimum cosine similarity between a photo and the reference image of a clue
+# for the photo to solve the clue
+PHOTO_MATCH_THRESHOLD = float(os.getenv("PHOTO_MATCH_THRESHOLD", "0.85"))
+# Candidates examined by the HNSW index when searching the closest clues
+PHOTO_MATCH_EF_SEARCH = int(os.getenv("PHOTO_MATCH_EF_SEARCH", "40"))
+
+# Recommendations configuration
+# Similar hunts shown on the details and completion pages of a hunt
+SIMILAR_HUNTS_COUNT = int(os.getenv("SIMILAR_HUNTS_COUNT", "3"))
+# Similar hunts cached per hunt, before removing those the user plays or created
+SIMILAR_HUNTS_CANDIDATES = 12
+# Number of hunts whose clue chain is kept in memory by each process
+CLUE_CHAIN_CACHE_SIZE = int(os.getenv("CLUE_CHAIN_CACHE_SIZE", "256"))
+
+# Background jobs configuration
+# Worker threads started by each process_jobs command
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+# Seconds a worker waits before looking for new jobs when the queue is empty
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Seconds before the first retry of a failed job, doubled at each attempt
+JOB_RETRY_DELAY = 30
+# Seconds after which a running job is considered abandoned by its worker
+JOB_TIMEOUT = 900
+# Seconds a done job is kept before being deleted
+JOB_RETENTION = 86400
+# Compute the CLIP embeddings of the clue images (requires torch and transformers)
+IMAGE_EMBEDDINGS_ENABLED = os.getenv("IMAGE_EMBEDDINGS_ENABLED", "False") == "True"
+# Let players solve clues with photos. The photos are embedded by the web
+# processes themselves, each loading the model (requires torch and transformers
+# on the web server), so this is separate from IMAGE_EMBEDDINGS_ENABLED
+PHOTO_VERIFICATION_ENABLED = IMAGE_EMBEDDINGS_ENABLED and (
+    os.getenv("PHOTO_VERIFICATION_ENABLED", "False") == "True"
+)
+# Maximum number of images embedded by one inference of the embedding worker
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+# CPU threads used by the inference, 0 to let torch use every core
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "2"))
+
+# Leaderboard streaming configuration
+# Maximum number of participants sent in a leaderboard
+LEADERBOARD_SIZE = 100
+# Seconds during which progress notifications are coalesced
+LEADERBOARD_DEBOUNCE = 0.5
+# Seconds between keepalive comments sent to idle spectators
+LEADERBOARD_KEEPALIVE = 15
+# Pending leaderboards kept for a slow spectator
+LEADERBOARD_QUEUE_SIZE = 2